@@ -1,9 +1,61 @@
 from __future__ import annotations
 
-from copy import deepcopy
+import hashlib
+from typing import NamedTuple
 
+import numpy as np
+
+from adtrees import binary_cache
 from adtrees.adnode import ADNode
-from utils.adtparser import file_to_dict
+from adtrees.compact import ACTORS
+from adtrees.compact import AND
+from adtrees.compact import BASIC
+from adtrees.compact import compact_tree
+from adtrees.compact import REFINEMENTS
+from utils.adtparser import parse_xml
+
+# attributes of ADTree built along with the dictionary, on first use, when the
+# tree is created from its compact representation (see ADTree.__getattr__)
+_FROM_DICT = frozenset(
+    [
+        "dict",
+        "root",
+        "basics",
+        "_parents",
+        "_counters",
+        "_label_nodes",
+        "_basic_actions",
+        "_compact_nodes",
+        "_node_ids",
+    ],
+)
+
+
+class TreeStats(NamedTuple):
+    """
+    Statistics of an ADTree, see ADTree.stats().
+    """
+
+    # number of (distinct) nodes
+    nodes: int
+    # number of nodes of the tree with DAG nodes unfolded, every countered
+    # node except the root counted twice (see ADTree.subtree_size())
+    size: int
+    # number of countered nodes
+    counters: int
+    # number of edges on the longest path from the root
+    depth: int
+    # number of children (countermeasure included) -> number of nodes
+    fan_out: dict
+    # number of nodes of the attacker / of the defender
+    attack_nodes: int
+    defense_nodes: int
+    # number of (distinct labels of) basic actions of the attacker / of the defender
+    attacks: int
+    defenses: int
+    # number of nodes having more than one parent, and the largest number of parents
+    shared: int
+    max_parents: int
 
 
 class ADTree:
@@ -15,10 +67,15 @@ class ADTree:
     Parameters
     ----------
     path: str, default ''
-        Path to an .xml output file produced by ADTool. If provided, the tree is loaded from the file.
+        Path to an .xml output file produced by ADTool. If provided, the tree is loaded from the file
+        (through its compiled binary file when adtrees.binary_cache.ENABLED).
     dictionary : dict, empty by default
         Dictionary with keys being ADNodes and values being lists
         of ADNodes. Dictionary[node] is a list of children of the node.
+    compact : CompactTree, default None
+        Compact representation of a tree. If provided, the tree is created from it.
+        The dictionary of a tree created from its compact representation (or
+        from a compiled binary file) is built on first use.
 
     Examples
     ----------
@@ -32,9 +89,8 @@ class ADTree:
     >>> T2 = ADTree('tree.xml')
     """
 
-    def __init__(self, path="", dictionary=None):
+    def __init__(self, path="", dictionary=None, compact=None):
         """
-        self.ad_term
         self.attack
         self.basics
         self.dict
@@ -42,41 +98,50 @@ class ADTree:
         """
         super().__init__()
 
+        # array-backed representation, built on demand by self.compact(), and
+        # the ADNodes of its ids (_compact_nodes, _node_ids, see _FROM_DICT)
+        self._compact = None
+        # statistics, ADTerm and boolean formula, computed on demand
+        self._stats = None
+        self._ad_term = None
+        self._boolean_expression = None
+        # gate list of the bit-parallel evaluation, built on demand
+        self._gates = None
+        self._structural_hash = None
+
         if dictionary is None:
             dictionary = {}
 
         # creating dictionary from ADTool's .xml file
         if isinstance(path, str) and path[-4:] == ".xml":
-            self.dict = file_to_dict(path)
-            if self.dict is None:
+            if binary_cache.ENABLED:
+                # the dictionary is built on first use, see __getattr__
+                self._compact, _ = binary_cache.load(path)
                 return
-            # set root
-            nodes_having_parents = []
-            for key in self.dict:
-                for node in self.dict[key]:
-                    nodes_having_parents.append(node)
-            # set root
-            for node in self.dict:
-                if node not in nodes_having_parents:
-                    self.root = node
-                    break
+            self.dict, self.root, _ = parse_xml(path)
+
+        # creating dictionary from the compact representation
+        elif compact is not None:
+            # the dictionary is built on first use, see __getattr__
+            self._compact = compact
+            return
 
         # creating dictionary from a dictionary
         elif isinstance(dictionary, dict) and len(dictionary) > 0:
             # tree is created from a dictionary.
             # check if the dictionary actually describes a tree
             keys = list(dictionary.keys())
-            in_lists = [node for item in dictionary.values() for node in item]
+            in_lists = {node for item in dictionary.values() for node in item}
             # 1. every element that is in one of the lists is also a key of the dictionary; and it is an ADNode
             for item in in_lists:
-                if not isinstance(item, ADNode) or item not in keys:
+                if not isinstance(item, ADNode) or item not in dictionary:
                     print(
                         "Either dictionary does not describe a tree or else not all of the elements are ADNodes.",
                     )
                     help(ADTree)
                     return
             # 2. there is exactly one element in the keys that is not in the lists, namely, the root of the tree.
-            roots = [i for i in keys if i not in set(in_lists)]
+            roots = [i for i in keys if i not in in_lists]
             if len(roots) != 1:
                 print("Invalid number of roots.")
                 help(ADTree)
@@ -95,111 +160,311 @@ class ADTree:
             self.attack = True
             self.root = ADNode(label="root")
             self.dict = {self.root: []}
-        # set term
-        self.ad_term = self.ad_term()
+        # index parents, countermeasures and basic actions
+        self.reindex()
+
+    def __getattr__(self, name):
+        """
+        Build the dictionary of a tree created from its compact representation,
+        and the indices over it, on first use of any of them.
+        """
+        # looked up in __dict__, as __getattr__ also runs on copies and unpickled trees
+        if name not in _FROM_DICT or self.__dict__.get("_compact") is None:
+            raise AttributeError(name)
+        if name == "_basic_actions":
+            # needed by every evaluation; no ADNodes required
+            self._basic_actions = self.__compact_basic_actions()
+            return self._basic_actions
+        compact = self._compact
+        self.dict, self.root, nodes = compact.to_dict()
+        self.__index()
+        # keep the compact representation the dictionary was created from
+        self._compact_nodes = nodes
+        self._node_ids = {node: i for i, node in enumerate(nodes)}
+        return getattr(self, name)
+
+    def reindex(self):
+        """
+        (Re)build the indices over self.dict: parents and countermeasure of
+        every node, the labels of basic actions of both actors and the nodes
+        bearing every label.
+
+        add_child() and remove_child() keep the indices up to date; call this
+        method after modifying self.dict directly.
+        """
+        self.__index()
+        self._invalidate()
+
+    def __index(self):
+        """
+        Build the indices over self.dict, see reindex().
+        """
+        # node -> list of its parents
+        self._parents = {node: [] for node in self.dict}
+        # node -> its countermeasure, None if it is not countered
+        self._counters = {}
+        # label -> list of nodes bearing the label
+        self._label_nodes = {}
         # store the set of all nodes holding basic actions of the tree.
-        self.basics = {node for node in self.dict if node.is_basic()}
+        self.basics = set()
+
+        for node, children in self.dict.items():
+            self._counters[node] = None
+            for child in children:
+                self._parents[child].append(node)
+                if self._counters[node] is None and child.type != node.type:
+                    self._counters[node] = child
+            self._label_nodes.setdefault(node.label, []).append(node)
+            if node.is_basic():
+                self.basics.add(node)
+
+        self.__index_basic_actions()
+
+    def __index_basic_actions(self):
+        """
+        Ordered lists of labels of basic actions, per actor.
+        """
+        self._basic_actions = {"a": [], "d": [], None: []}
+        for label, nodes in self._label_nodes.items():
+            for actor in ("a", "d"):
+                if any(node.type == actor and node.is_basic() for node in nodes):
+                    self._basic_actions[actor].append(label)
+            if any(node.is_basic() for node in nodes):
+                self._basic_actions[None].append(label)
+
+    def __compact_basic_actions(self):
+        """
+        The lists of __index_basic_actions, computed from the compact representation.
+        """
+        ct = self._compact
+        basic = ct.ref == BASIC
+        of_actor = {
+            actor: set(ct.label[basic & (ct.actor == ACTORS.index(actor))].tolist())
+            for actor in ("a", "d")
+        }
+        # labels in the order of their first node, as in self._label_nodes
+        ids, first = np.unique(ct.label, return_index=True)
+        ordered = ids[np.argsort(first)].tolist()
+
+        basic_actions = {"a": [], "d": [], None: []}
+        for i in ordered:
+            for actor in ("a", "d"):
+                if i in of_actor[actor]:
+                    basic_actions[actor].append(ct.labels[i])
+            if i in of_actor["a"] or i in of_actor["d"]:
+                basic_actions[None].append(ct.labels[i])
+        return basic_actions
+
+    def _invalidate(self):
+        """
+        Drop everything derived from the structure of the tree; called after edits.
+        """
+        self._compact = None
+        self._compact_nodes = None
+        self._node_ids = None
+        self._stats = None
+        self._ad_term = None
+        self._boolean_expression = None
+        self._gates = None
+        self._structural_hash = None
+
+    def add_child(self, parent, child):
+        """
+        Add 'child' (a node of the tree or a new ADNode) to the children of 'parent'.
+        """
+        if parent not in self.dict or not isinstance(child, ADNode):
+            print("Parent does not belong to the tree or child is not an ADNode.")
+            help(ADTree.add_child)
+            return
+        if child not in self.dict:
+            self.dict[child] = []
+            self._parents[child] = []
+            self._counters[child] = None
+            nodes = self._label_nodes.setdefault(child.label, [])
+            nodes.append(child)
+            if child.is_basic():
+                self.basics.add(child)
+                others = [n for n in nodes[:-1] if n.is_basic()]
+                if not others:
+                    self._basic_actions[None].append(child.label)
+                if not any(n.type == child.type for n in others):
+                    self._basic_actions[child.type].append(child.label)
+
+        self.dict[parent].append(child)
+        self._parents[child].append(parent)
+        if self._counters[parent] is None and child.type != parent.type:
+            self._counters[parent] = child
+        self._invalidate()
+
+    def remove_child(self, parent, child):
+        """
+        Remove 'child' from the children of 'parent'. Nodes that are no
+        longer reachable are removed from the tree.
+        """
+        if parent not in self.dict or child not in self.dict[parent]:
+            print("Node provided is not a child of the parent.")
+            help(ADTree.remove_child)
+            return
+        self.dict[parent].remove(child)
+        self._parents[child].remove(parent)
+        if self._counters[parent] is child and child not in self.dict[parent]:
+            self._counters[parent] = next(
+                (c for c in self.dict[parent] if c.type != parent.type),
+                None,
+            )
+
+        # drop the nodes left without a parent
+        orphans = [child] if not self._parents[child] else []
+        relabel = False
+        while orphans:
+            node = orphans.pop()
+            for c in self.dict.pop(node):
+                self._parents[c].remove(node)
+                if not self._parents[c]:
+                    orphans.append(c)
+            del self._parents[node]
+            del self._counters[node]
+            self._label_nodes[node.label].remove(node)
+            if not self._label_nodes[node.label]:
+                del self._label_nodes[node.label]
+            if node.is_basic():
+                self.basics.discard(node)
+                relabel = True
+
+        if relabel:
+            self.__index_basic_actions()
+        self._invalidate()
 
     def ad_term(self, node=None):
         """
         Given an ADTree T and one of its nodes, create an ADTerm that corresponds
         to the subtree of T rooted in the node.
-        If no node passed, then the ADTerm created corresponds to T.
-        """
-        if node is None:
-            node = self.root
-        countered = self.is_countered(node)
-        countermeasure = self.get_counter(node)
-        if node.is_basic():
-            # the node represents a basic action; has at most one child,
-            # which is a countermeasure
-            if not countered:
-                # the node is a leaf of the tree
-                return node.label
-            else:
-                return (
-                    "C"
-                    + node.type
-                    + "("
-                    + node.label
-                    + ","
-                    + self.ad_term(countermeasure)
-                    + ")"
-                )
-        else:
-            # else the node is refined and has children of the same type.
-            if countered:
-                result = "C" + node.type + "(" + node.ref + node.type + "("
-                for child in self.dict[node]:
-                    if child != countermeasure:
-                        result += self.ad_term(child)
-                        result += ","
-                # put the countermeasure at the end
-                result = result[:-1] + "),"
-                result += self.ad_term(countermeasure)
-                result += ")"
-                return result
-            else:
-                result = node.ref + node.type + "("
-                for child in self.dict[node]:
-                    result += self.ad_term(child)
-                    result += ","
-                result = result[:-1] + ")"
-                return result
+        If no node passed, then the ADTerm created corresponds to T (cached).
+        """
+        if node is not None:
+            return "".join(self.__render("term", self.node_id(node)))
+        if self._ad_term is None:
+            self._ad_term = "".join(self.__render("term", 0))
+        return self._ad_term
 
     def get_boolean_expression(self, node=None):
-        if node is None:
-            node = self.root
-
-        countered = self.is_countered(node)
-        countermeasure = self.get_counter(node)
-
-        if node.is_basic():
-            result = node.label
-        elif node.ref == "AND":
-            result = (
-                "("
-                + " & ".join(
-                    self.get_boolean_expression(c)
-                    for c in self.dict[node]
-                    if c != countermeasure
-                )
-                + ")"
-            )
-        else:
-            result = (
-                "("
-                + " | ".join(
-                    self.get_boolean_expression(c)
-                    for c in self.dict[node]
-                    if c != countermeasure
-                )
-                + ")"
-            )
+        """
+        Return the boolean formula (in the syntax accepted by `dd`) describing
+        when the goal of a given node is reached. If no node passed, then the
+        formula corresponds to the root of the tree (cached).
+        """
+        if node is not None:
+            return "".join(self.__render("bool", self.node_id(node)))
+        if self._boolean_expression is None:
+            self._boolean_expression = "".join(self.__render("bool", 0))
+        return self._boolean_expression
 
-        if countered:
-            return f"({result} & !{self.get_boolean_expression(countermeasure)})"
+    def __render(self, fmt, i, counter=False):
+        """
+        Yield, in order, the pieces of the ADTerm ('term'), the boolean formula
+        ('bool') or the ADTool .xml contents ('xml') of the subtree rooted in
+        node i of the compact representation.
 
-        return result
+        The subtree is walked with an explicit stack, so deep trees do not hit
+        the recursion limit. Subtrees shared by several parents are rendered
+        once, into a buffer of their own, and the result is reused.
+
+        //Node treated as a countermeasure if counter = True; technical parameter for 'xml'.
+        """
+        ct = self.compact()
+        shared = (ct.parent_counts() > 1).tolist()
+        shared_memo = {}
+        # buffers of the shared subtrees being rendered, innermost last
+        buffers = []
+
+        # items are either pieces of the output, (node, counter) pairs to expand
+        # or (None, (node, counter)) markers closing the buffer of a shared node
+        stack = [(i, counter)]
+        while stack:
+            item = stack.pop()
+            if not isinstance(item, str) and item[0] is None:
+                # all the pieces of the shared subtree are in its buffer
+                shared_memo[item[1]] = "".join(buffers.pop())
+                item = shared_memo[item[1]]
+            if isinstance(item, str):
+                if buffers:
+                    buffers[-1].append(item)
+                else:
+                    yield item
+                continue
+
+            j, counter = item
+            if shared[j]:
+                if item in shared_memo:
+                    stack.append(shared_memo[item])
+                    continue
+                buffers.append([])
+                stack.append((None, item))
+
+            actor = ACTORS[ct.actor[j]]
+            ref = REFINEMENTS[ct.ref[j]]
+            label = ct.get_label(j)
+            children = ct.get_children(j)
+            countermeasure = int(ct.counter[j])
+            countered = countermeasure != -1
+
+            if fmt == "term":
+                if ref == "":
+                    # the node represents a basic action; has at most one child,
+                    # which is a countermeasure
+                    pieces = [label]
+                else:
+                    pieces = [ref + actor + "("]
+                    for child in children:
+                        pieces += [(child, False), ","]
+                    if children:
+                        pieces.pop()
+                    pieces.append(")")
+                if countered:
+                    # put the countermeasure at the end
+                    pieces = ["C" + actor + "("] + pieces
+                    pieces += [",", (countermeasure, False), ")"]
+            elif fmt == "bool":
+                if ref == "":
+                    pieces = [label]
+                else:
+                    op = " & " if ref == "AND" else " | "
+                    pieces = ["("]
+                    for child in children:
+                        pieces += [(child, False), op]
+                    if children:
+                        pieces.pop()
+                    pieces.append(")")
+                if countered:
+                    pieces = ["("] + pieces + [" & !", (countermeasure, False), ")"]
+            else:
+                # in ADTool 2.2.2, default refinement for basic actions is
+                # "disjunctive"
+                xml_ref = '"conjunctive"' if ref == "AND" else '"disjunctive"'
+                # if the node itself is a countermeasure, switch actors
+                switch = ' switchRole="yes"' if counter else ""
+                pieces = [
+                    f"\t<node refinement={xml_ref}{switch}>\n"
+                    + f"\t\t<label>{label}</label>\n\t",
+                ]
+                pieces += [(child, False) for child in children]
+                if countered:
+                    pieces.append((countermeasure, True))
+                pieces.append("</node>\n")
+
+            stack.extend(reversed(pieces))
 
     def get_basic_actions(self, actor=None):
         """
         Return the list of labels of basic actions of a given actor ('a', 'd' or None) in the tree.
         If no actor provided, return the list of all basic actions.
+
+        The list is cached and should not be modified.
         """
         if actor not in ["a", "d", None]:
             help(ADTree)
             return
-        bas = []
-        if actor is None:
-            allowed = ["a", "d"]
-        else:
-            allowed = [actor]
-        for node in self.basics:
-            if node.type in allowed:
-                if node.label not in bas:
-                    bas.append(node.label)
-        return bas
+        return self._basic_actions[actor]
 
     def get_children(self, node):
         """
@@ -207,52 +472,156 @@ class ADTree:
         """
         return self.dict[node]
 
-    def subtree_size(self):
+    def compact(self):
+        """
+        Return the compact, array-backed representation of the tree
+        (see adtrees.compact.CompactTree). Built on first use and cached.
+        """
+        if self._compact is None:
+            self._compact, self._compact_nodes = compact_tree(self.dict, self.root)
+            self._node_ids = {node: i for i, node in enumerate(self._compact_nodes)}
+        return self._compact
 
-        new_tree = deepcopy(self)
-        children = 1  # count self
+    def node_id(self, node):
+        """
+        Return the id of a node in the compact representation of the tree.
+        """
+        self.compact()
+        return self._node_ids[node]
 
-        unvisited = new_tree.get_children(new_tree.root)
-        while unvisited:
-            current = unvisited.pop(0)
-            if new_tree.is_countered(current):
-                children += 1
-            children += 1
-            unvisited.extend(new_tree.get_children(current))
+    def node_at(self, i):
+        """
+        Return the node with id i in the compact representation of the tree.
+        """
+        self.compact()
+        return self._compact_nodes[i]
 
-        return children
+    def structural_hash(self):
+        """
+        Return a hex digest of the structure of the tree: the actors,
+        refinements, labels, children and countermeasures of its nodes, in the
+        order of the compact representation. Trees with the same structure
+        have the same digest, whatever their basic assignment.
+        """
+        if self._structural_hash is None:
+            ct = self.compact()
+            h = hashlib.sha256()
+            for arr in (
+                ct.actor,
+                ct.ref,
+                ct.label,
+                ct.child_offsets,
+                ct.children,
+                ct.counter,
+            ):
+                h.update(np.ascontiguousarray(arr).tobytes())
+            h.update("\0".join(ct.labels).encode("utf-8"))
+            self._structural_hash = h.hexdigest()
+        return self._structural_hash
+
+    def subtree_size(self):
+        """
+        Return the number of nodes of the tree, every countered node except
+        the root being counted twice (once for the INH gate it forms).
+        """
+        return self.stats().size
+
+    def stats(self):
+        """
+        Return the statistics of the tree (see TreeStats), computed in a
+        single linear traversal of the compact representation. Cached.
+        """
+        if self._stats is not None:
+            return self._stats
+
+        ct = self.compact()
+        n = len(ct)
+        countered = ct.counter != -1
+
+        n_children = np.diff(ct.child_offsets) + countered
+        n_parents = ct.parent_counts()
+
+        # number of occurrences of every node in the unfolded tree (parents first),
+        # and the height of every node (children first)
+        occurrences = [0] * n
+        occurrences[0] = 1
+        height = [0] * n
+        children = [ct.get_children(i) for i in range(n)]
+        for i in range(n):
+            for c in children[i]:
+                occurrences[c] += occurrences[i]
+            if countered[i]:
+                occurrences[ct.counter[i]] += occurrences[i]
+        for i in reversed(range(n)):
+            kids = children[i] + ([ct.counter[i]] if countered[i] else [])
+            if kids:
+                height[i] = 1 + max(height[c] for c in kids)
+
+        size = sum(occurrences) + sum(
+            occ for i, occ in enumerate(occurrences) if i and countered[i]
+        )
+        attack_nodes = int(np.count_nonzero(ct.actor == 0))
+
+        self._stats = TreeStats(
+            nodes=n,
+            size=size,
+            counters=int(np.count_nonzero(countered)),
+            depth=height[0] if n else 0,
+            fan_out={
+                k: count
+                for k, count in enumerate(np.bincount(n_children).tolist())
+                if count
+            },
+            attack_nodes=attack_nodes,
+            defense_nodes=n - attack_nodes,
+            attacks=len(self.get_basic_actions("a")),
+            defenses=len(self.get_basic_actions("d")),
+            shared=int(np.count_nonzero(n_parents > 1)),
+            max_parents=int(n_parents.max()) if n else 0,
+        )
+        return self._stats
+
+    def get_nodes(self, label):
+        """
+        Return the list of the nodes of the tree bearing 'label'.
+        """
+        return self._label_nodes.get(label, [])
 
     def is_countered(self, node):
-        if self.get_counter(node) is not None:
-            return True
-        return False
+        return self._counters.get(node) is not None
 
     def get_counter(self, node):
         """
         Return a countermeasure to a given node, if there is one.
-        False otherwise.
+        None otherwise.
 
         Returns ADNode.
         """
-        if node not in self.dict:
+        if node not in self._counters:
             print("Node provided does not belong to the tree.")
             print()
             help(ADTree.get_counter)
             return
-        ntype = node.type
-        for child in self.dict[node]:
-            if child.type != ntype:
-                return child
-        return None
+        return self._counters[node]
 
     def get_parent(self, node):
         """
         Return parent node of a given node.
         """
-        for candidate, children in self.dict.items():
-            if node in children:
-                return candidate
-        return None
+        parents = self._parents.get(node)
+        return parents[0] if parents else None
+
+    def get_parents(self, node):
+        """
+        Return the list of parents of a given node (more than one if the node is shared).
+        """
+        return self._parents[node]
+
+    def refcount(self, node):
+        """
+        Return the number of references to a given node, i.e., the number of its parents.
+        """
+        return len(self._parents[node])
 
     def is_proper_tree(self):
         if self.root.type == "a":
@@ -284,51 +653,87 @@ class ADTree:
             else:
                 actor = "a"
 
-        all_basic_labels = self.get_basic_actions(actor)
-        if label not in all_basic_labels:
-            return False
         counter = 0
-        for node in self.basics:
-            if node.type == actor and node.label == label:
-                counter += 1
+        for node in self._label_nodes.get(label, []):
+            if node.type == actor and node.is_basic():
+                # a shared node counts once per parent
+                counter += max(1, len(self._parents[node]))
             if counter > 1:
                 return True
         return False
 
     def is_strategy_successful(self, activation_map: dict):
-        return self.__is_strategy_successful(self.root, activation_map)
-
-    def __is_strategy_successful(
-        self,
-        node: ADNode,
-        activation_map: dict,
-        check_countered=True,
-    ):
-        is_inh_gate = check_countered and self.is_countered(node)
-
-        if is_inh_gate:
-            counter_node = self.get_counter(node)
-            # we have an INH gate between `node` and `counter_node`
-            return self.__is_strategy_successful(
-                node,
-                activation_map,
-                check_countered=False,
-            ) and not self.__is_strategy_successful(counter_node, activation_map)
-
-        if node.ref == "":  # Basic action
-            return activation_map[node.label]
-        else:  # AND / OR nodes
-            children_activations = [
-                self.__is_strategy_successful(child, activation_map)
-                for child in self.get_children(node)
-                if self.get_counter(node) != child
-            ]
-
-            return (
-                all(children_activations)
-                if node.ref == "AND"
-                else any(children_activations)
-            )
+        """
+        Check whether the root is reached when the basic actions 'l' with
+        activation_map[l] = True are executed.
+        """
+        activations = {
+            label: int(bool(activation_map[label]))
+            for label in self.get_basic_actions()
+        }
+        return bool(self.are_strategies_successful(activations) & 1)
+
+    def gates(self):
+        """
+        Return the tree compiled into a flat list of gates (i, ref, inputs, counter),
+        children first: node i is a basic action with label id 'inputs'
+        (ref = BASIC) or the conjunction / disjunction of the nodes 'inputs'
+        (ref = AND / OR), inhibited by the node 'counter' unless counter = -1.
+        Built on first use and cached.
+        """
+        if self._gates is None:
+            ct = self.compact()
+            gates = []
+            # children have larger ids than their parents
+            for i in range(len(ct) - 1, -1, -1):
+                ref = int(ct.ref[i])
+                inputs = int(ct.label[i]) if ref == BASIC else ct.get_children(i)
+                gates.append((i, ref, inputs, int(ct.counter[i])))
+            self._gates = gates
+        return self._gates
+
+    def are_strategies_successful(self, activations: dict):
+        """
+        Bit-parallel version of is_strategy_successful.
+
+        activations[l] packs the activations of the basic action 'l' in many
+        strategies, one strategy per bit: a Python int (of any width) or a
+        NumPy array of uint64 words. The result packs the same way whether
+        the root is reached in each strategy. Every gate is a single bitwise
+        AND / OR, and INH gates are ANDNOTs.
+
+        Examples
+        ----------
+        >>> T = ADTree('./data/trees_w_assignments/thesis_dag.xml')
+        >>> # bit k of activations[l] is set if strategy k executes 'l'
+        >>> activations = {l: 0 for l in T.get_basic_actions()}
+        >>> T.are_strategies_successful(activations)
+        0
+        """
+        ct = self.compact()
+        template = next(iter(activations.values()), 0)
+        zeros = template ^ template
+        ones = ~zeros
+
+        values = [None] * len(ct)
+        for i, ref, inputs, counter in self.gates():
+            if ref == BASIC:
+                value = activations[ct.labels[inputs]]
+            elif ref == AND:
+                value = ones
+                for c in inputs:
+                    value = value & values[c]
+            else:
+                value = zeros
+                for c in inputs:
+                    value = value | values[c]
+
+            if counter != -1:
+                # INH gate between `i` and its counter
+                value = value & ~values[counter]
+            values[i] = value
+
+        return values[0]
 
     def order(self):
         """
@@ -343,48 +748,8 @@ class ADTree:
 
         //Node treated as a countermeasure if counter = 1; technical parameter.
         """
-        if node is None:
-            node = self.root
-        countered = self.is_countered(node)
-        countermeasure = self.get_counter(node)
-
-        if node.ref == "AND":
-            ref = '"conjunctive"'
-        else:
-            # in ADTool 2.2.2, default refinement for basic actions is
-            # "disjunctive"
-            ref = '"disjunctive"'
-
-        if not counter:
-            # if the node is not a countermeasure itself, no switching of
-            # actors
-            prefix = (
-                "\t<node refinement="
-                + ref
-                + ">\n"
-                + "\t\t<label>"
-                + node.label
-                + "</label>\n\t"
-            )
-        else:
-            # if the node itself is a countermeasure, switch actors
-            prefix = (
-                "\t<node refinement="
-                + ref
-                + ' switchRole="yes">\n'
-                + "\t\t<label>"
-                + node.label
-                + "</label>\n\t"
-            )
-
-        result = prefix
-        for child in self.dict[node]:
-            if child != countermeasure:
-                result += self.__xml__(child)
-        if countered:
-            result += self.__xml__(countermeasure, 1)
-        result += "</node>\n"
-        return result
+        i = 0 if node is None else self.node_id(node)
+        return "".join(self.__render("xml", i, bool(counter)))
 
     def output(self, name=""):
         """
@@ -398,7 +763,7 @@ class ADTree:
         with open(name, "w") as f:
             f.write("<?xml version='1.0'?>\n")
             f.write("<adtree>\n")
-            f.write(self.__xml__(self.root))
+            f.writelines(self.__render("xml", 0))
             f.write("</adtree>")
         print(
             'Tree structure written to "' + name + '", ready to be opened with ADTool!',
@@ -406,4 +771,4 @@ class ADTree:
         return
 
     def __repr__(self):
-        return self.ad_term
+        return self.ad_term()
@@ -1,22 +1,85 @@
 from __future__ import annotations
 
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from heapq import heappop
+from heapq import heappush
 from itertools import chain
 from itertools import combinations
 from itertools import product
 
+import numpy as np
 from colorama import Fore
 from colorama import init
 
-from adtrees.adnode import ADNode
 from adtrees.adtree import ADTree
 from adtrees.basic_assignment import BasicAssignment
+from adtrees.compact import ACTORS
+from adtrees.compact import AND
+from adtrees.compact import BASIC
+from adtrees.compact import CompactTree
+from adtrees.compact import REFINEMENTS
+from adtrees.incremental import IncrementalEvaluator
+from utils.util import as_points
+from utils.util import best_within_budget
+from utils.util import cheapest_above_threshold
+from utils.util import combine_fronts_min
+from utils.util import combine_fronts_sum
 from utils.util import remove_dominated_pts
 from utils.util import remove_low_att_pts
+from utils.util import restrict_front
+from utils.util import thin_front
+from utils.util import thin_front_to_size
 
 init(autoreset=True)
 
 PRINT_INTERMEDIATE = False
 MAX_PARETO_SIZE = 0
+# evaluate_dummiest checks the attack subsets in blocks of 2^DUMMIEST_BLOCK_BITS
+DUMMIEST_BLOCK_BITS = 16
+# evaluate_cutsets keeps at most this many memoized attack set families
+CUTSETS_MEMO_SIZE = 100000
+
+
+# NumPy counterparts of the operations of the usual domains
+_UFUNCS = {min: np.minimum, max: np.maximum, sum: np.add}
+
+
+def _as_ufunc(op):
+    """
+    Return a binary ufunc computing op([x, y]).
+    """
+    if op in _UFUNCS:
+        return _UFUNCS[op]
+    return np.frompyfunc(lambda x, y: op([x, y]), 2, 1)
+
+
+def _subset_sums(values):
+    """
+    Array of the sums of the 2^n subsets of 'values', subset s containing
+    values[j] iff bit j of s is set.
+    """
+    sums = np.zeros(1)
+    for v in values:
+        sums = np.concatenate((sums, sums + v))
+    return sums
+
+
+def _bit_columns(k):
+    """
+    Packed bit columns of the 2^k subsets of k elements: bit s of the j-th
+    column (a uint64 array) is set iff bit j of s is set.
+    """
+    subsets = np.arange(1 << k)
+    # at least one word; the bits past 2^k are left unset
+    bits = np.zeros(64 * -(-(1 << k) // 64), dtype=np.uint8)
+    columns = []
+    for j in range(k):
+        bits[: 1 << k] = (subsets >> j) & 1
+        columns.append(np.packbits(bits, bitorder="little").view("<u8"))
+    return columns
 
 
 def powerset(iterable):
@@ -58,6 +121,8 @@ class AttrDomain:
     """
 
     def __init__(self, or_d, and_d, or_a, and_a, neutral_d, absorb_a):
+        # hit statistics of the memo of the last evaluation, if memoized
+        self.memo_stats = None
         self.or_d = or_d
         self.and_d = and_d
         self.neutral_d = neutral_d
@@ -75,36 +140,60 @@ class AttrDomain:
         ba: BasicAssignment,
         print_progress: True,
     ):
-        """Exponential in the number of basic events."""
+        """
+        Exponential in the number of basic events.
+
+        The attack subsets are checked 2^DUMMIEST_BLOCK_BITS at a time, one
+        per bit, with ADTree.are_strategies_successful: the first attacks
+        vary within a block, the others are fixed for the whole block.
+        """
         pts = []
         all_defenses = tree.get_basic_actions("d")
         all_attacks = tree.get_basic_actions("a")
 
-        for active_defs in powerset(all_defenses):
-            att_costs = []
-            def_cost = sum([ba[d] for d in all_defenses if d in active_defs])
+        self._check_assigned(tree, ba)
+        costs = ba.intern(tree.compact().labels)
 
-            for active_atts in powerset(all_attacks):
-                new_assignment = BasicAssignment()
+        # an action is activated iff it is chosen and its value is not the neutral/absorbing one
+        can_activate = {d: ba[d] != self.neutral_d for d in all_defenses}
+        can_activate.update({a: ba[a] != self.absorb_a for a in all_attacks})
 
-                for a in all_attacks:
-                    new_assignment[a] = ba[a] if a in active_atts else self.absorb_a
+        k = min(len(all_attacks), DUMMIEST_BLOCK_BITS)
+        low, high = all_attacks[:k], all_attacks[k:]
+        # att_costs[s] = cost of the attack subset s (bit j set if low[j] is in s)
+        low_costs = _subset_sums(costs[ba.ids_of(low)])
+        high_costs = _subset_sums(costs[ba.ids_of(high)])
 
-                for d in all_defenses:
-                    new_assignment[d] = ba[d] if d in active_defs else self.neutral_d
+        columns = _bit_columns(k)
+        zeros = np.zeros_like(columns[0]) if columns else np.zeros(1, np.uint64)
+        ones = ~zeros
+        activations = {
+            a: column if can_activate[a] else zeros for a, column in zip(low, columns)
+        }
 
-                activation_map = self.get_activation_map(tree, new_assignment)
+        for active_defs in powerset(all_defenses):
+            def_cost = costs[ba.ids_of(active_defs)].sum()
+            for d in all_defenses:
+                activations[d] = zeros
+            for d in active_defs:
+                activations[d] = ones if can_activate[d] else zeros
 
-                if tree.is_strategy_successful(activation_map):  # successful
-                    att_cost = sum([ba[a] for a in all_attacks if a in active_atts])
+            att_cost = float("inf")
+            for h, high_cost in enumerate(high_costs):
+                for j, a in enumerate(high):
+                    activations[a] = ones if (h >> j) & 1 and can_activate[a] else zeros
 
-                    att_costs.append(att_cost)
+                packed = tree.are_strategies_successful(activations)
+                successful = np.unpackbits(
+                    packed.astype("<u8").view(np.uint8),
+                    bitorder="little",
+                )[: len(low_costs)]
+                if successful.any():
+                    att_cost = min(
+                        att_cost, low_costs[successful.astype(bool)].min() + high_cost
+                    )
 
-            pair = (
-                (def_cost, float("inf"))
-                if len(att_costs) == 0
-                else (def_cost, min(att_costs))
-            )
+            pair = (def_cost, att_cost)
 
             if print_progress:
                 print(f"Added for defense {active_defs} : {pair}")
@@ -116,34 +205,147 @@ class AttrDomain:
 
         return pts
 
-    def evaluate_dummy_bu(
+    def evaluate_cutsets(
         self,
         tree: ADTree,
         ba: BasicAssignment,
         print_progress: True,
     ):
-        """Exponential in the number of basic defense steps."""
+        """
+        Exponential in the number of basic defense steps; same front as
+        evaluate_dummiest.
+
+        Once the defenses are fixed, the success of an attacker node is
+        monotone in the executed attacks and that of a defender node is
+        antitone. So each node is described by its minimal successful attack
+        sets (attacker) or its minimal defeating attack sets (defender),
+        computed bottom-up with unions and pairwise joins, keeping only the
+        minimal sets. The sets of a node depend only on the defenses below it,
+        and are memoized across the defense subsets under that key, keeping
+        the CUTSETS_MEMO_SIZE most recently used ones; the hit statistics are
+        stored in self.memo_stats.
+        """
         pts = []
         all_defenses = tree.get_basic_actions("d")
         all_attacks = tree.get_basic_actions("a")
 
-        for active_defs in powerset(all_defenses):
-            new_assignment = BasicAssignment()
-            for a in all_attacks:
-                new_assignment[a] = ba[a]
+        self._check_assigned(tree, ba)
+        ct = tree.compact()
+        costs = ba.intern(ct.labels)
 
-            # When a defense activate, equate its cost with the neutral element
-            for d in all_defenses:
-                new_assignment[d] = ba[d] if d in active_defs else self.neutral_d
+        # attack sets are bitmasks over the attacks that can be activated
+        att_costs = []
+        att_bit = {}
+        for a in all_attacks:
+            if ba[a] != self.absorb_a:
+                label_id = ba.ids[a]
+                att_bit[label_id] = 1 << len(att_costs)
+                att_costs.append(costs[label_id])
+        def_bit = {
+            label_id: 1 << j for j, label_id in enumerate(ba.ids_of(all_defenses))
+        }
+        can_activate = {d: ba[d] != self.neutral_d for d in all_defenses}
+
+        # below[i] = bitmask of the defenses in the subtree of i
+        below = [0] * len(ct)
+        for i in range(len(ct) - 1, -1, -1):
+            if ct.ref[i] == BASIC:
+                below[i] = def_bit.get(int(ct.label[i]), 0)
+            for c in ct.get_inputs(i):
+                below[i] |= below[c]
+
+        # the sets of a node below every defense are never reused
+        every_defense = (1 << len(all_defenses)) - 1
+        memo = OrderedDict()
+        hits = misses = 0
+        # Gray-code order: consecutive subsets differ by one defense, so the
+        # recently used sets are the likely hits
+        for k in range(2 ** len(all_defenses)):
+            gray = k ^ (k >> 1)
+            active_defs = tuple(
+                d for j, d in enumerate(all_defenses) if (gray >> j) & 1
+            )
+            def_cost = costs[ba.ids_of(active_defs)].sum()
+            active = sum(
+                1 << all_defenses.index(d) for d in active_defs if can_activate[d]
+            )
+
+            sets = {}
+            stack = [(0, False)]
+            while stack:
+                i, expanded = stack.pop()
+                if i in sets:
+                    continue
+                key = (i, active & below[i])
+                if key in memo:
+                    sets[i] = memo[key]
+                    memo.move_to_end(key)
+                    hits += 1
+                    continue
+                if not expanded:
+                    stack.append((i, True))
+                    stack.extend((c, False) for c in ct.get_inputs(i) if c not in sets)
+                    continue
+                sets[i] = _node_cutsets(ct, i, sets, att_bit, def_bit, active)
+                misses += 1
+                if below[i] != every_defense:
+                    memo[key] = sets[i]
+                    if len(memo) > CUTSETS_MEMO_SIZE:
+                        memo.popitem(last=False)
 
-            bu_result = self.__bottomup(tree, tree.root, new_assignment)
+            att_cost = float("inf")
+            if ct.actor[0] == ACTORS.index("a"):
+                for attack_set in sets[0]:
+                    att_cost = min(att_cost, _set_cost(attack_set, att_costs))
+            elif 0 not in sets[0]:
+                # the empty attack does not defeat the defender's root
+                att_cost = 0
+            pair = (def_cost, att_cost)
 
+            if print_progress:
+                print(f"Added for defense {active_defs} : {pair}")
+
+            pts.append(pair)
+
+        self.memo_stats = {"hits": hits, "misses": misses, "size": len(memo)}
+
+        return remove_dominated_pts(pts)
+
+    def evaluate_dummy_bu(
+        self,
+        tree: ADTree,
+        ba: BasicAssignment,
+        print_progress: True,
+        memoize: bool = True,
+    ):
+        """
+        Exponential in the number of basic defense steps.
+
+        If memoize is True, the defense subsets are enumerated in Gray-code
+        order, so that consecutive subsets differ by one defense, and only the
+        fronts of the nodes above that defense are re-evaluated (see
+        IncrementalEvaluator). Otherwise, every subset is evaluated from scratch.
+        """
+        pts = []
+        all_defenses = tree.get_basic_actions("d")
+
+        self._check_assigned(tree, ba)
+
+        if memoize:
+            subsets = self.__dummy_bu_gray(tree, ba, all_defenses)
+        else:
+            subsets = self.__dummy_bu_powerset(tree, ba, all_defenses)
+
+        for active_defs, bu_result in subsets:
             if print_progress:
                 print(f"Added for defense {active_defs} : {bu_result}")
             pts.extend(bu_result)
 
         pf = remove_dominated_pts(pts)
 
+        if print_progress and self.memo_stats is not None:
+            print(f"Fronts evaluated: {self.memo_stats['evaluated']}")
+
         if not tree.is_proper_tree():
             print(
                 Fore.YELLOW
@@ -152,11 +354,62 @@ class AttrDomain:
 
         return pf
 
-    def evaluate_bu(self, tree: ADTree, ba: BasicAssignment, print_progress: True):
+    def __dummy_bu_powerset(self, tree: ADTree, ba: BasicAssignment, all_defenses):
+        """
+        Yield (active defenses, front) for every subset of the defenses.
+        """
+        self.memo_stats = None
+        ct = tree.compact()
+        base_costs = ba.intern(ct.labels)
+
+        for active_defs in powerset(all_defenses):
+            # When a defense is not active, equate its cost with the neutral element
+            costs = base_costs.copy()
+            costs[ba.ids_of(d for d in all_defenses if d not in active_defs)] = (
+                self.neutral_d
+            )
+            yield active_defs, as_points(self.__bottomup(ct, 0, costs.tolist()))
+
+    def __dummy_bu_gray(self, tree: ADTree, ba: BasicAssignment, all_defenses):
+        """
+        Yield (active defenses, front) for every subset of the defenses, in Gray-code order.
+        """
+        # When a defense is not active, equate its cost with the neutral element
+        assignment = ba.deepcopy()
+        for d in all_defenses:
+            assignment[d] = self.neutral_d
+        active = [False] * len(all_defenses)
+
+        evaluator = IncrementalEvaluator(self, tree, assignment)
+        for k in range(2 ** len(all_defenses)):
+            if k:
+                # the k-th subset differs from the previous one in the lowest set bit of k
+                j = (k & -k).bit_length() - 1
+                active[j] = not active[j]
+                assignment[all_defenses[j]] = (
+                    ba[all_defenses[j]] if active[j] else self.neutral_d
+                )
+            active_defs = tuple(d for d, on in zip(all_defenses, active) if on)
+            yield active_defs, evaluator.front()
+
+        evaluator.close()
+        self.memo_stats = {"evaluated": evaluator.evaluated}
+
+    def evaluate_bu(
+        self,
+        tree: ADTree,
+        ba: BasicAssignment,
+        print_progress: True,
+        memoize: bool = True,
+    ):
         """
         Compute the value of the attribute modeled with the 'self' domain
         in the tree 'T', under the basic assignment 'ba', using
         the bottom-up evaluation.
+
+        If memoize is True, the front of a node shared by several parents is
+        computed once; the hit statistics are stored in self.memo_stats.
+        Otherwise, it is computed again for every parent.
         """
         global PRINT_INTERMEDIATE
 
@@ -164,18 +417,22 @@ class AttrDomain:
         #     raise TypeError('T is not a proper tree')
 
         # initial checks; make sure that every basic action is assigned a value
-        if missing := [label for label in tree.get_basic_actions() if label not in ba]:
-            raise ValueError(
-                f"Cannot perform the attribute evaluation: Actions {missing} have no value assigned.",
-            )
+        self._check_assigned(tree, ba)
 
         PRINT_INTERMEDIATE = print_progress
 
-        bu = self.__bottomup(tree, tree.root, ba)
+        ct = tree.compact()
+        memo = _Memo() if memoize else None
+        bu = as_points(
+            self.__bottomup(ct, 0, ba.intern(ct.labels).tolist(), memo=memo),
+        )
+        self.memo_stats = memo.stats() if memo is not None else None
 
         if print_progress:
             print(f"Pareto Front Size: {len(bu)}")
             print(f"Max P.F. Size: {MAX_PARETO_SIZE}")
+            if memo is not None:
+                print(f"Memo hits: {memo.hits}, misses: {memo.misses}")
             if not tree.is_proper_tree():
                 print(
                     Fore.YELLOW
@@ -183,42 +440,455 @@ class AttrDomain:
                 )
         return bu
 
-    def __bottomup(self, tree, node: ADNode, ba: BasicAssignment, check_countered=True):
+    def evaluate_bu_approx(
+        self,
+        tree: ADTree,
+        ba: BasicAssignment,
+        epsilon: float | None = None,
+        max_front_size: int | None = None,
+        print_progress: bool = False,
+    ):
         """
-        Value of the attribute obtained at 'node' of adtree 'T' when using the
-        bottom-up procedure under the basic assignment 'ba'.
+        Approximate bottom-up evaluation: the front of every node is thinned
+        (see utils.util.thin_front), so that either every point of the exact
+        Pareto front is within a factor 1 + epsilon of a point of the result,
+        or the fronts have at most max_front_size points.
 
-        proponent in {'a', 'd'}.
+        Returns (front, error): every point (d, a) of the exact front is
+        covered by a point (d', a') of 'front' with d' <= (1 + error) * d and
+        a' >= a / (1 + error). The points of 'front' are exact values of
+        actual strategies.
+
+        Examples
+        ----------
+        >>> pf, error = minCostofAttack.evaluate_bu_approx(T, ba, epsilon=0.01)
         """
+        if epsilon is None and max_front_size is None:
+            raise ValueError("Provide either epsilon or max_front_size.")
 
-        global MAX_PARETO_SIZE
+        self._check_assigned(tree, ba)
 
-        is_inh_gate = check_countered and tree.is_countered(node)
+        delta = 0.0
+        if epsilon is not None:
+            # the errors multiply along a path, where every node (and INH gate) is thinned
+            levels = 2 * (tree.stats().depth + 1)
+            delta = (1 + epsilon) ** (1 / levels) - 1
 
-        if is_inh_gate:
-            counter_node = tree.get_counter(node)
-            # we have an INH gate between `node` and `counter_node`
-            pts = self._bottom_up_inh(tree, node, counter_node, ba)
-        elif node.ref == "":  # Basic action
-            pts = (
-                [(0, float(ba[node.label]))]
-                if node.type == "a"
-                else [(0, 0), (ba[node.label], float("inf"))]
+        if max_front_size is None:
+            thin = partial(thin_front, delta=delta)
+        else:
+            thin = partial(thin_front_to_size, max_size=max_front_size, delta=delta)
+
+        ct = tree.compact()
+        memo = _Memo()
+        pf = as_points(
+            self.__bottomup(ct, 0, ba.intern(ct.labels).tolist(), memo=memo, thin=thin),
+        )
+        error = memo.errors[memo.key(0, ct.counter[0] != -1)] - 1
+
+        if print_progress:
+            print(f"Pareto Front Size: {len(pf)}")
+            print(f"Approximation error: {error:.4%}")
+        return pf, error
+
+    def query_budget(self, tree: ADTree, ba: BasicAssignment, budget: float):
+        """
+        Minimum attack cost under the best defense whose cost is at most
+        'budget' (see utils.util.best_within_budget).
+
+        The points above the budget are pruned from the front of every node
+        during the bottom-up evaluation, so only the part of the Pareto front
+        within the budget is computed.
+
+        Examples
+        ----------
+        >>> minCostofAttack.query_budget(T, ba, 50)
+        """
+        return best_within_budget(self.__query_front(tree, ba, budget=budget), budget)
+
+    def query_threshold(self, tree: ADTree, ba: BasicAssignment, threshold: float):
+        """
+        Cheapest defense that pushes the minimum attack cost above 'threshold'
+        (see utils.util.cheapest_above_threshold); infinity if there is none.
+
+        The attack costs above the threshold are replaced by infinity in the
+        front of every node during the bottom-up evaluation, which collapses
+        the part of the Pareto front beyond the threshold into a single point.
+
+        Examples
+        ----------
+        >>> minCostofAttack.query_threshold(T, ba, 100)
+        """
+        front = self.__query_front(tree, ba, threshold=threshold)
+        return cheapest_above_threshold(front, threshold)
+
+    def __query_front(
+        self, tree: ADTree, ba: BasicAssignment, budget=None, threshold=None
+    ):
+        """
+        Pareto front of the tree restricted to a query (see utils.util.restrict_front).
+        """
+        self._check_assigned(tree, ba)
+
+        def restrict(pf):
+            return remove_dominated_pts(restrict_front(pf, budget, threshold)), 1.0
+
+        ct = tree.compact()
+        return as_points(
+            self.__bottomup(
+                ct, 0, ba.intern(ct.labels).tolist(), memo=_Memo(), thin=restrict
+            ),
+        )
+
+    def evaluate_bu_batch(self, tree: ADTree, cost_matrix, labels=None):
+        """
+        Bottom-up evaluation of the tree 'T' under many basic assignments at once.
+
+        'cost_matrix' is a (scenarios x basic actions) array, whose columns hold
+        the values of 'labels' (by default, T.get_basic_actions()). Returns the
+        list of the Pareto fronts computed by evaluate_bu, one per scenario.
+
+        The evaluation schedule is computed once, and every node is evaluated in
+        all the scenarios at once with NumPy. Subtrees without defender nodes have
+        the single point (0, value), so only their values are computed. The
+        operations of the domain are assumed to be associative, as children are
+        combined pairwise.
+
+        Examples
+        ----------
+        >>> costs = np.array([[ba[label] for label in T.get_basic_actions()]])
+        >>> minCostofAttack.evaluate_bu_batch(T, costs * [[1.0], [0.5], [2.0]])
+        """
+        ct = tree.compact()
+        labels = tree.get_basic_actions() if labels is None else list(labels)
+        cost_matrix = np.atleast_2d(np.asarray(cost_matrix, dtype=np.float64))
+        if cost_matrix.shape[1] != len(labels):
+            raise ValueError(
+                f"Expected {len(labels)} columns in the cost matrix, got {cost_matrix.shape[1]}.",
             )
-        else:  # AND / OR nodes
-            pts = self._process_children(tree, node, ba)
 
-        pf = remove_dominated_pts(pts)
+        column = {label: k for k, label in enumerate(labels)}
+        if missing := [
+            label for label in tree.get_basic_actions() if label not in column
+        ]:
+            raise ValueError(
+                f"Cannot perform the attribute evaluation: Actions {missing} have no value assigned.",
+            )
 
-        if PRINT_INTERMEDIATE:
-            color = Fore.RED if node.type == "a" else Fore.GREEN
-            print(
-                color
-                + f"{'(INH) ' if is_inh_gate else ''}{node}, (Size {len(pf)}), {pf}",
+        n_scenarios = len(cost_matrix)
+        scenarios = np.arange(n_scenarios)
+        static, steps = self.__batch_schedule(ct, column, cost_matrix)
+
+        # The fronts of a node in all the scenarios are stored together, as the
+        # arrays (scenario, defense, attack) of their points, sorted by scenario
+        pf = {}
+
+        def front(i):
+            if i in pf:
+                return pf[i]
+            return scenarios, np.zeros(n_scenarios), static[i]
+
+        for i, leaf, children, ops, counter, inh_ops in steps:
+            if leaf is not None:
+                is_attack, k = leaf
+                values = cost_matrix[:, k]
+                if is_attack:
+                    pts = scenarios, np.zeros(n_scenarios), values
+                else:
+                    pts = _prune_batch(
+                        np.repeat(scenarios, 2),
+                        np.column_stack((np.zeros(n_scenarios), values)).ravel(),
+                        np.tile([0.0, np.inf], n_scenarios),
+                    )
+            else:
+                pts = front(children[0])
+                for child in children[1:]:
+                    pts = _combine_batch(pts, front(child), *ops, n_scenarios)
+
+            if counter != -1:
+                pts = _combine_batch(pts, front(counter), *inh_ops, n_scenarios)
+            pf[i] = pts
+
+        seg, defs, atts = front(0)
+        bounds = np.cumsum(np.bincount(seg, minlength=n_scenarios))[:-1]
+        return [
+            list(zip(d.tolist(), a.tolist()))
+            for d, a in zip(np.split(defs, bounds), np.split(atts, bounds))
+        ]
+
+    def __batch_schedule(self, ct: CompactTree, column, cost_matrix):
+        """
+        Return (static, steps) for evaluate_bu_batch.
+
+        static maps the nodes without defender nodes below them to the attack
+        values of their single point, in every scenario. steps lists the other
+        nodes, children first, as tuples
+        (node, leaf, children, operations, counter, INH operations), where
+        leaf = (is attack, column of its value) for basic actions, else None.
+        """
+        static = {}
+        steps = []
+        for i in range(len(ct) - 1, -1, -1):
+            actor = ACTORS[ct.actor[i]]
+            counter = int(ct.counter[i])
+            # children with the same label are evaluated once, as in _process_children
+            children = list({ct.label[c]: c for c in ct.get_children(i)}.values())
+            is_static = (
+                actor == "a"
+                and counter == -1
+                and all(child in static for child in children)
             )
-            MAX_PARETO_SIZE = max(MAX_PARETO_SIZE, len(pf))
 
-        return pf
+            if ct.ref[i] == BASIC:
+                k = column[ct.get_label(i)]
+                if is_static:
+                    static[i] = cost_matrix[:, k]
+                    continue
+                leaf = (actor == "a", k)
+                ops = None
+            else:
+                ops = tuple(
+                    map(
+                        _as_ufunc,
+                        self._get_combine_operators(actor, REFINEMENTS[ct.ref[i]]),
+                    )
+                )
+                if is_static:
+                    static[i] = np.asarray(
+                        ops[1].reduce([static[child] for child in children]),
+                        dtype=np.float64,
+                    )
+                    continue
+                leaf = None
+
+            inh_ops = None
+            if counter != -1:
+                inh_ops = tuple(
+                    map(_as_ufunc, self._get_combine_operators(actor, "INH"))
+                )
+            steps.append((i, leaf, children, ops, counter, inh_ops))
+
+        return static, steps
+
+    def evaluate_bu_parallel(
+        self,
+        tree: ADTree,
+        ba: BasicAssignment,
+        workers: int | None = None,
+        min_subtree_cost: int = 10000,
+        print_progress: bool = False,
+    ):
+        """
+        Bottom-up evaluation, with the subtrees of the tree evaluated in
+        parallel in a ProcessPoolExecutor of 'workers' processes (by default,
+        one per CPU). The domain must be picklable (e.g., no lambdas).
+
+        The tree is split top-down, the most costly subtree first, into at most
+        4 * workers subtrees whose estimated cost (number of nodes times one plus
+        the number of defenses below) is at least 'min_subtree_cost'. Every subtree
+        is shipped in compact form together with its values, and the subtrees are
+        submitted the most costly first, so that the idle workers take the largest
+        remaining ones (LPT scheduling). Their fronts seed the evaluation of the
+        nodes above them, which is done in this process.
+
+        Returns the same front as evaluate_bu.
+        """
+        self._check_assigned(tree, ba)
+        workers = workers or os.cpu_count() or 1
+
+        ct = tree.compact()
+        costs = ba.intern(ct.labels).tolist()
+        estimates = _estimate_costs(ct)
+        root = (0, ct.counter[0] != -1)
+
+        # split the most costly subtree into its inputs, until there are enough subtrees;
+        # the root is always evaluated in this process
+        heap = [(-estimates[root], root)]
+        frontier = {root}
+        while heap and (len(heap) < 4 * workers or root in frontier):
+            cost, state = heappop(heap)
+            if -cost < min_subtree_cost:
+                heappush(heap, (cost, state))
+                break
+            frontier.remove(state)
+            for j in _inputs(ct, *state):
+                if j not in frontier:
+                    frontier.add(j)
+                    heappush(heap, (-estimates[j], j))
+        tasks = sorted(
+            (state for state in frontier if estimates[state] >= min_subtree_cost),
+            key=lambda state: -estimates[state],
+        )
+
+        memo = _Memo()
+        if tasks:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {}
+                for i, is_inh_gate in tasks:
+                    sub, _, label_ids = ct.subtree(i)
+                    futures[i, is_inh_gate] = executor.submit(
+                        _evaluate_subtree,
+                        self,
+                        sub,
+                        [costs[k] for k in label_ids],
+                        is_inh_gate,
+                    )
+                for (i, is_inh_gate), future in futures.items():
+                    memo.fronts[memo.key(i, is_inh_gate)] = future.result()
+
+        if print_progress:
+            print(f"Subtrees evaluated in parallel: {len(tasks)}")
+
+        return as_points(self.__bottomup(ct, 0, costs, memo=memo))
+
+    def _evaluate(self, ct: CompactTree, costs: list, check_countered=True):
+        """
+        Front of the root of the compact tree 'ct' under the values 'costs' (indexed by label id).
+        """
+        return self.__bottomup(
+            ct, 0, costs, check_countered=check_countered, memo=_Memo()
+        )
+
+    def _check_assigned(self, tree: ADTree, ba: BasicAssignment):
+        """
+        Make sure that every basic action of 'tree' is assigned a value under 'ba'.
+        """
+        if missing := [label for label in tree.get_basic_actions() if label not in ba]:
+            raise ValueError(
+                f"Cannot perform the attribute evaluation: Actions {missing} have no value assigned.",
+            )
+
+    def __bottomup(
+        self,
+        ct: CompactTree,
+        i: int,
+        costs: list,
+        check_countered=True,
+        memo: _Memo | None = None,
+        thin=None,
+    ):
+        """
+        Value of the attribute obtained at node 'i' of the compact tree 'ct' when using the
+        bottom-up procedure under the basic assignment 'costs' (values indexed by label id,
+        see BasicAssignment.intern).
+
+        The nodes are visited in post-order with an explicit stack, so the depth
+        of the tree is not limited by the recursion limit. The front of every node
+        is stored in 'memo', so a node shared by several parents is evaluated once.
+        If memo is None, every occurrence of a shared node is evaluated again.
+
+        If given, thin(front) --> (thinned front, factor) is applied to the front of
+        every node (see utils.util.thin_front); the error factor of every node, i.e.,
+        the largest factor of its inputs times its own, is stored in memo.errors.
+        A memo is required with thin.
+
+        proponent in {'a', 'd'}.
+        """
+        if memo is None:
+            if thin is not None:
+                raise ValueError("A memo is required to thin the fronts.")
+            return self.__bottomup_unshared(ct, i, costs, check_countered)
+
+        fronts = memo.fronts
+
+        def front_of(j, check_countered=True):
+            return fronts[memo.key(j, check_countered and ct.counter[j] != -1)]
+
+        # (node, whether its INH gate is evaluated, whether its inputs are evaluated)
+        stack = [(i, check_countered and ct.counter[i] != -1, False)]
+
+        while stack:
+            i, is_inh_gate, expanded = stack.pop()
+            key = memo.key(i, is_inh_gate)
+
+            if not expanded:
+                if key in fronts:
+                    memo.hits += 1
+                    continue
+                stack.append((i, is_inh_gate, True))
+                # the first input ends up on top of the stack
+                stack.extend(
+                    (j, inh, False) for j, inh in reversed(_inputs(ct, i, is_inh_gate))
+                )
+                continue
+
+            if key in fronts:
+                continue
+            memo.misses += 1
+
+            pf = self.__node_front(ct, i, is_inh_gate, costs, front_of)
+
+            if thin is not None:
+                pf, factor = thin(pf)
+                memo.errors[key] = factor * max(
+                    (
+                        memo.errors[memo.key(j, inh)]
+                        for j, inh in _inputs(ct, i, is_inh_gate)
+                    ),
+                    default=1.0,
+                )
+
+            _print_intermediate(ct, i, is_inh_gate, pf)
+            fronts[key] = pf
+
+        return fronts[key]
+
+    def __bottomup_unshared(
+        self, ct: CompactTree, i: int, costs: list, check_countered
+    ):
+        """
+        Same as __bottomup without a memo: the fronts of the inputs of a node are
+        kept only until the node is evaluated, so every occurrence of a shared
+        node is evaluated again, as in the recursive evaluation.
+        """
+        result = {}
+        # (node, whether its INH gate is evaluated, fronts of its inputs or None
+        # if they are not evaluated yet, where to store its front)
+        stack = [(i, check_countered and ct.counter[i] != -1, None, result)]
+
+        while stack:
+            i, is_inh_gate, inputs, out = stack.pop()
+
+            if inputs is None:
+                inputs = {}
+                stack.append((i, is_inh_gate, inputs, out))
+                # the first input ends up on top of the stack
+                stack.extend(
+                    (j, inh, None, inputs)
+                    for j, inh in reversed(_inputs(ct, i, is_inh_gate))
+                )
+                continue
+
+            def front_of(j, check_countered=True, inputs=inputs):
+                return inputs[j, check_countered and ct.counter[j] != -1]
+
+            pf = self.__node_front(ct, i, is_inh_gate, costs, front_of)
+            _print_intermediate(ct, i, is_inh_gate, pf)
+            out[i, is_inh_gate] = pf
+
+        return next(iter(result.values()))
+
+    def __node_front(self, ct: CompactTree, i, is_inh_gate, costs, front_of):
+        """
+        Front of node 'i' (of its INH gate, if is_inh_gate), where front_of(j, check_countered)
+        is the front of an input.
+        """
+        # the combinations of fronts are Pareto fronts already
+        if is_inh_gate:
+            # we have an INH gate between `i` and its counter
+            return self._bottom_up_inh(ct, i, int(ct.counter[i]), front_of)
+        if ct.ref[i] == BASIC:  # Basic action
+            return self._leaf_front(ACTORS[ct.actor[i]], costs[ct.label[i]])
+        # AND / OR nodes
+        return self._process_children(ct, i, front_of)
+
+    def _leaf_front(self, actor, cost):
+        """
+        Front of a basic action of 'actor' with value 'cost'.
+        """
+        return remove_dominated_pts(
+            [(0, float(cost))] if actor == "a" else [(0, 0), (cost, float("inf"))]
+        )
 
     def _get_combine_operators(self, actor, node_ref):
         if node_ref in ("AND", "INH"):
@@ -226,42 +896,58 @@ class AttrDomain:
         else:
             return (self.and_d, self.or_a) if actor == "a" else (self.and_d, self.and_a)
 
-    def _process_children(self, tree: ADTree, node: ADNode, ba: BasicAssignment):
+    def _process_children(self, ct: CompactTree, i: int, front_of):
+        """
+        Front of the AND / OR node 'i', where front_of(child) is the front of a child.
+        """
         pf_map = {}
 
-        for child in tree.get_children(node):
-            if tree.get_counter(node) != child:
-                pf_map[child.label] = self.__bottomup(tree, child, ba)
+        for child in ct.get_children(i):
+            pf_map[ct.label[child]] = front_of(child)
 
-        strategies = []
-        def_op, att_op = self._get_combine_operators(node.type, node.ref)
+        def_op, att_op = self._get_combine_operators(
+            ACTORS[ct.actor[i]],
+            REFINEMENTS[ct.ref[i]],
+        )
 
-        for cart_prod in product(*list(pf_map.values())):
+        return self._combine(list(pf_map.values()), def_op, att_op)
+
+    def _combine(self, fronts, def_op, att_op):
+        """
+        Pareto front of the combinations of one point of each of the 'fronts'.
+
+        For the usual operations (sum of the defense costs, sum or min of the
+        attack costs), the fronts are folded pairwise, so that dominated
+        points are pruned at every step; large fronts are kept as (N, 2) arrays
+        (see utils.util.ARRAY_THRESHOLD). Otherwise the full Cartesian product
+        of the fronts is built.
+        """
+        if def_op is sum and att_op in (sum, min) and fronts:
+            combine_fronts = combine_fronts_sum if att_op is sum else combine_fronts_min
+            pf = fronts[0]
+            for front in fronts[1:]:
+                pf = combine_fronts(pf, front)
+            return pf
+
+        strategies = []
+        for cart_prod in product(*fronts):
             strategies.append(
                 (def_op([p[0] for p in cart_prod]), att_op([p[1] for p in cart_prod])),
             )
 
         return remove_dominated_pts(strategies)
 
-    def _bottom_up_inh(
-        self,
-        tree: ADTree,
-        action: ADNode,
-        counter: ADNode,
-        ba: BasicAssignment,
-    ):
-        action_pf = self.__bottomup(tree, action, ba, check_countered=False)
-        counter_pf = self.__bottomup(tree, counter, ba)
+    def _bottom_up_inh(self, ct: CompactTree, action: int, counter: int, front_of):
+        """
+        Front of the INH gate between 'action' and 'counter', where
+        front_of(node, check_countered) is the front of a node.
+        """
+        action_pf = front_of(action, check_countered=False)
+        counter_pf = front_of(counter)
 
-        def_op, att_op = self._get_combine_operators(action.type, "INH")
+        def_op, att_op = self._get_combine_operators(ACTORS[ct.actor[action]], "INH")
 
-        strategies = [
-            (def_op([act_def, cnt_def]), att_op([act_att, cnt_att]))
-            for act_def, act_att in action_pf
-            for cnt_def, cnt_att in counter_pf
-        ]
-
-        return remove_dominated_pts(strategies)
+        return self._combine([action_pf, counter_pf], def_op, att_op)
 
     def get_activation_map(self, tree: ADTree, ba: BasicAssignment):
         activations = {}
@@ -272,3 +958,191 @@ class AttrDomain:
             activations[a] = False if ba[a] == self.absorb_a else True
 
         return activations
+
+
+def _print_intermediate(ct: CompactTree, i, is_inh_gate, pf):
+    """
+    Print the front of a node if PRINT_INTERMEDIATE is set, and track MAX_PARETO_SIZE.
+    """
+    global MAX_PARETO_SIZE
+
+    if PRINT_INTERMEDIATE:
+        node = ct.node(i)
+        color = Fore.RED if node.type == "a" else Fore.GREEN
+        print(
+            color + f"{'(INH) ' if is_inh_gate else ''}{node}, (Size {len(pf)}), {pf}",
+        )
+        MAX_PARETO_SIZE = max(MAX_PARETO_SIZE, len(pf))
+
+
+def _inputs(ct: CompactTree, i, is_inh_gate):
+    """
+    The nodes whose fronts the front of node 'i' is combined from, as pairs
+    (node, whether its INH gate is evaluated).
+    """
+    if is_inh_gate:
+        inputs = [(i, False), (int(ct.counter[i]), True)]
+    elif ct.ref[i] == BASIC:
+        inputs = []
+    else:
+        inputs = [(child, True) for child in ct.get_children(i)]
+    return [(j, check and ct.counter[j] != -1) for j, check in inputs]
+
+
+def _evaluate_subtree(domain: AttrDomain, ct: CompactTree, costs, check_countered):
+    """
+    Front of the root of 'ct'; run in the worker processes of evaluate_bu_parallel.
+    """
+    return domain._evaluate(ct, costs, check_countered)
+
+
+def _node_cutsets(ct: CompactTree, i, sets, att_bit, def_bit, active):
+    """
+    Minimal successful (attacker node) or defeating (defender node) attack
+    sets of node i, its INH gate included, given those of its inputs and the
+    bitmask 'active' of the active defenses (see AttrDomain.evaluate_cutsets).
+    """
+    attacker = ct.actor[i] == ACTORS.index("a")
+    label = int(ct.label[i])
+    if ct.ref[i] == BASIC:
+        if attacker:
+            result = [att_bit[label]] if label in att_bit else []
+        else:
+            # an active defense is never defeated, an inactive one always is
+            result = [] if active & def_bit.get(label, 0) else [0]
+    else:
+        children = [sets[c] for c in ct.get_children(i)]
+        if (ct.ref[i] == AND) == attacker:
+            # every child succeeds / every child is defeated
+            result, join = [0], _join_sets
+        else:
+            result, join = [], _union_sets
+        for child in children:
+            result = join(result, child)
+
+    counter = ct.counter[i]
+    if counter != -1:
+        if attacker:
+            # succeeds and its countermeasure is defeated
+            result = _join_sets(result, sets[counter])
+        else:
+            # defeated, or its countermeasure succeeds
+            result = _union_sets(result, sets[counter])
+    return result
+
+
+def _minimal_sets(family):
+    """
+    Sets (bitmasks) of 'family' with no proper subset in 'family'.
+    """
+    minimal = []
+    for s in sorted(set(family), key=lambda s: bin(s).count("1")):
+        if all(m & s != m for m in minimal):
+            minimal.append(s)
+    return minimal
+
+
+def _union_sets(f, g):
+    return _minimal_sets(f + g)
+
+
+def _join_sets(f, g):
+    return _minimal_sets([x | y for x in f for y in g])
+
+
+def _set_cost(attack_set, att_costs):
+    cost = 0
+    j = 0
+    while attack_set:
+        if attack_set & 1:
+            cost += att_costs[j]
+        attack_set >>= 1
+        j += 1
+    return cost
+
+
+class _Memo:
+    """
+    Pareto fronts computed during a bottom-up evaluation, keyed by
+    (node id, whether the node's INH gate is evaluated).
+    """
+
+    def __init__(self):
+        self.fronts = {}
+        self.errors = {}
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, i, is_inh_gate):
+        return i, is_inh_gate
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.fronts)}
+
+
+def _estimate_costs(ct: CompactTree):
+    """
+    Estimated cost of the evaluation of every (node, INH gate) of 'ct': the number
+    of nodes below it, times one plus the number of defenses below it.
+    """
+    sizes = {}
+    defenses = {}
+    # children have larger ids than their parents
+    for i in range(len(ct) - 1, -1, -1):
+        for is_inh_gate in (False, True) if ct.counter[i] != -1 else (False,):
+            inputs = _inputs(ct, i, is_inh_gate)
+            state = (i, is_inh_gate)
+            sizes[state] = (not is_inh_gate) + sum(sizes[j] for j in inputs)
+            defenses[state] = (
+                int(
+                    ct.ref[i] == BASIC
+                    and ACTORS[ct.actor[i]] == "d"
+                    and not is_inh_gate
+                )
+            ) + sum(defenses[j] for j in inputs)
+    return {state: sizes[state] * (1 + defenses[state]) for state in sizes}
+
+
+def _prune_batch(seg, defs, atts):
+    """
+    remove_dominated_pts applied to the points of every scenario at once.
+    """
+    order = np.lexsort((-atts, defs, seg))
+    seg = seg[order]
+    defs = defs[order]
+    atts = atts[order]
+
+    # Keep a point iff its attack cost beats all the previous points of its scenario.
+    # Ranking the attack costs and shifting them by scenario turns this into a
+    # single running maximum, since every scenario starts above the previous one.
+    _, ranks = np.unique(atts, return_inverse=True)
+    keys = seg * (len(atts) + 1) + ranks.ravel()
+    keep = np.empty(len(keys), dtype=bool)
+    keep[:1] = True
+    keep[1:] = keys[1:] > np.maximum.accumulate(keys)[:-1]
+
+    return seg[keep], defs[keep], atts[keep]
+
+
+def _combine_batch(pts1, pts2, def_op, att_op, n_scenarios):
+    """
+    Pareto fronts of the combinations of a point of pts1 with a point of pts2
+    of the same scenario, in every scenario.
+    """
+    seg1, defs1, atts1 = pts1
+    seg2, defs2, atts2 = pts2
+    counts2 = np.bincount(seg2, minlength=n_scenarios)
+    starts2 = np.cumsum(counts2) - counts2
+
+    # pair every point of pts1 with each of the points of pts2 of its scenario
+    repeats = counts2[seg1]
+    idx1 = np.repeat(np.arange(len(seg1)), repeats)
+    offsets = np.arange(len(idx1)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+    seg = seg1[idx1]
+    idx2 = starts2[seg] + offsets
+
+    return _prune_batch(
+        seg,
+        np.asarray(def_op(defs1[idx1], defs2[idx2]), dtype=np.float64),
+        np.asarray(att_op(atts1[idx1], atts2[idx2]), dtype=np.float64),
+    )
@@ -2,11 +2,16 @@ from __future__ import annotations
 
 from copy import deepcopy
 
+import numpy as np
+
+from adtrees import binary_cache
 from utils.adtparser import get_basic_assignment_xml
 from utils.util import clean_tla_identifier
 
 
 def _from_xml(path):
+    if binary_cache.ENABLED:
+        return binary_cache.load(path)[1]
     return get_basic_assignment_xml(path)
 
 
@@ -78,6 +83,18 @@ class BasicAssignment:
             a .txt file storing a basic assignment.
 
     If no path provided, an empty basic assignment is created, ready to be populated.
+
+    Array mode: after intern(labels), the values are also stored in the
+    float64 array self.costs, where self.costs[k] is the value of labels[k]
+    (NaN if there is none). self.ids maps the labels to their indices.
+
+    Examples
+    ----------
+    >>> T = ADTree('./data/trees_w_assignments/thesis_dag.xml')
+    >>> ba = BasicAssignment('./data/trees_w_assignments/thesis_dag.xml')
+    >>> ct = T.compact()
+    >>> costs = ba.intern(ct.labels)
+    >>> costs[ct.label]  # values of all nodes of T, NaN for refined nodes
     """
 
     def __init__(self, path=None):
@@ -94,11 +111,45 @@ class BasicAssignment:
             # initialize with an empty dictionary
             self.map = {}
 
+        # array mode, see self.intern()
+        self.labels = None
+        self.ids = None
+        self.costs = None
+
+        # functions called as listener(label, value) after every update
+        self.listeners = []
+
     def deepcopy(self):
         new = BasicAssignment()
         new.map = deepcopy(self.map)
+        if self.labels is not None:
+            new.intern(self.labels, self.costs.dtype)
         return new
 
+    def intern(self, labels, dtype=np.float64):
+        """
+        Switch to array mode: intern 'labels' (e.g., CompactTree.labels) and
+        store their values in the array self.costs, in the same order.
+        Labels without a value get NaN.
+
+        Returns self.costs.
+        """
+        if self.labels is not None and list(labels) == self.labels:
+            return self.costs
+        self.labels = list(labels)
+        self.ids = {label: k for k, label in enumerate(self.labels)}
+        self.costs = np.array(
+            [self.map.get(label, np.nan) for label in self.labels],
+            dtype=dtype,
+        )
+        return self.costs
+
+    def ids_of(self, labels):
+        """
+        Return the array of the interned ids of 'labels'.
+        """
+        return np.array([self.ids[label] for label in labels], dtype=np.int64)
+
     def __contains__(self, label):
         """
         Check whether 'label' is assigned a value under the assignment 'self'.
@@ -112,15 +163,20 @@ class BasicAssignment:
         """
         Update or add a value corresponding to an action.
         """
-        self.map[str(label)] = value
+        label = str(label)
+        self.map[label] = value
+        if self.ids is not None and label in self.ids:
+            self.costs[self.ids[label]] = value
+        for listener in self.listeners:
+            listener(label, value)
 
     def __getitem__(self, label):
-        if str(label) in self:
-            return self.map[str(label)]
-
-        raise ValueError(
-            "The action '" + str(label) + "' is not assigned any value.",
-        )
+        try:
+            return self.map[label if isinstance(label, str) else str(label)]
+        except KeyError:
+            raise ValueError(
+                "The action '" + str(label) + "' is not assigned any value.",
+            ) from None
 
     def output(self, name):
         """
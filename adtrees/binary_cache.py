@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from adtrees.compact import compact_tree
+from adtrees.compact import CompactTree
+from utils.adtparser import parse_xml
+
+# Use the cache in ADTree(path), BasicAssignment(path) and loader.load(path);
+# off unless ADTREES_CACHE_DIR is set
+ENABLED = "ADTREES_CACHE_DIR" in os.environ
+# Directory holding the compiled files, named after the sha256 of their source
+CACHE_DIR = os.environ.get("ADTREES_CACHE_DIR") or os.path.join(
+    os.path.expanduser("~"),
+    ".cache",
+    "adtrees",
+)
+
+MAGIC = b"ADTC"
+VERSION = 1
+
+# magic, version, sha256 of the source, n. of nodes, n. of child entries,
+# n. of labels, size of the label table in bytes
+_HEADER = struct.Struct("<4sI32sQQQQ")
+_ALIGN = 8
+
+# path -> (mtime, size, sha256) of the sources hashed by this process
+_digests = {}
+
+
+def cache_path(digest):
+    """
+    Path of the compiled file of the ADTool .xml files whose contents hash to 'digest'.
+    """
+    return os.path.join(CACHE_DIR, digest.hex() + ".adtc")
+
+
+def source_digest(path):
+    """
+    Return the sha256 of the contents of 'path'. The file is hashed again
+    only if its modification time or size changed since the last call.
+    """
+    stat = os.stat(path)
+    known = _digests.get(path)
+    if known is not None and known[:2] == (stat.st_mtime_ns, stat.st_size):
+        return known[2]
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).digest()
+    _digests[path] = stat.st_mtime_ns, stat.st_size, digest
+    return digest
+
+
+def load(path):
+    """
+    Path to an ADTool .xml file --> (CompactTree, dictionary containing the basic assignment).
+
+    If CACHE_DIR holds the compiled file of the current contents of 'path',
+    the node arrays are zero-copy views of the memory-mapped file. Otherwise
+    the .xml file is parsed and compiled, and the compiled file is written.
+    """
+    try:
+        digest = source_digest(path)
+    except FileNotFoundError as exc:
+        raise FileNotFoundError(
+            f"Couldn't load ADTree from {path}\nThere is no such file or directory.",
+        ) from exc
+
+    target = cache_path(digest)
+    compiled = read(target, digest)
+    if compiled is not None:
+        return compiled
+
+    dictionary, root, assignment = parse_xml(path)
+    ct, _ = compact_tree(dictionary, root)
+    try:
+        write(target, digest, ct, assignment)
+    except OSError:
+        # read-only location; the cache is only an optimization
+        pass
+    return ct, assignment
+
+
+def write(target, digest, ct: CompactTree, assignment):
+    """
+    Write the compiled file 'target' for a tree and its basic assignment.
+    """
+    costs = np.array(
+        [assignment.get(label, np.nan) for label in ct.labels],
+        dtype=np.float64,
+    )
+    label_table = "\0".join(ct.labels).encode("utf-8")
+    header = _HEADER.pack(
+        MAGIC,
+        VERSION,
+        digest,
+        len(ct),
+        len(ct.children),
+        len(ct.labels),
+        len(label_table),
+    )
+
+    directory = os.path.dirname(target)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        for arr in _arrays(ct, costs):
+            f.write(b"\0" * (-f.tell() % _ALIGN))
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.write(label_table)
+    os.replace(tmp, target)
+
+
+def read(target, digest):
+    """
+    Return (CompactTree, basic assignment) stored in the compiled file
+    'target', or None if the file is missing, corrupted or stale.
+    """
+    try:
+        with open(target, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        magic, version, stored, n, n_children, n_labels, table_size = (
+            _HEADER.unpack_from(mm)
+        )
+    except struct.error:
+        return None
+    if magic != MAGIC or version != VERSION or stored != digest:
+        return None
+
+    offset = _HEADER.size
+    arrays = []
+    try:
+        for dtype, count in _layout(n, n_children, n_labels):
+            offset += -offset % _ALIGN
+            arrays.append(np.frombuffer(mm, dtype=dtype, count=count, offset=offset))
+            offset += arrays[-1].nbytes
+    except ValueError:
+        return None
+    if offset + table_size != len(mm):
+        return None
+    labels = mm[offset:].decode("utf-8").split("\0") if n_labels else []
+
+    actor, ref, label, child_offsets, children, counter, costs = arrays
+    ct = CompactTree(actor, ref, label, labels, child_offsets, children, counter)
+    # labels without a value are stored as NaN
+    assignment = {
+        lbl: cost for lbl, cost in zip(labels, costs.tolist()) if not math.isnan(cost)
+    }
+    return ct, assignment
+
+
+def _layout(n, n_children, n_labels):
+    return [
+        (np.uint8, n),
+        (np.uint8, n),
+        (np.int32, n),
+        (np.int64, n + 1),
+        (np.int32, n_children),
+        (np.int32, n),
+        (np.float64, n_labels),
+    ]
+
+
+def _arrays(ct, costs):
+    return [
+        ct.actor,
+        ct.ref,
+        ct.label,
+        ct.child_offsets,
+        ct.children,
+        ct.counter,
+        costs,
+    ]
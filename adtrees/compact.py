@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+from collections import deque
+
+import numpy as np
+
+from adtrees.adnode import ADNode
+
+# actor[i] and ref[i] index into these
+ACTORS = ("a", "d")
+REFINEMENTS = ("", "AND", "OR")
+
+BASIC = 0
+AND = 1
+OR = 2
+
+
+class CompactTree:
+    """
+    Compact, array-backed representation of the structure of an ADTree.
+
+    class CompactTree(self, actor, ref, label, labels, child_offsets, children, counter)
+
+    Nodes are identified by integers 0, ..., n - 1. Node 0 is the root and
+    every node is numbered before all of its children, so iterating over the
+    ids in reverse order visits the children before their parents.
+
+    Parameters
+    ----------
+    actor : uint8 array of length n
+        0 for a node of the attacker, 1 for a node of the defender.
+    ref : uint8 array of length n
+        0 for a basic action, 1 for an 'AND' node, 2 for an 'OR' node.
+    label : int32 array of length n
+        Index of the node's label in 'labels'.
+    labels : list of str
+        Interned labels; every label appears exactly once.
+    child_offsets : int64 array of length n + 1
+    children : int32 array
+        The children of node i (countermeasure excluded) are
+        children[child_offsets[i]:child_offsets[i + 1]].
+    counter : int32 array of length n
+        Id of the countermeasure of node i, -1 if the node is not countered.
+    """
+
+    def __init__(self, actor, ref, label, labels, child_offsets, children, counter):
+        self.actor = actor
+        self.ref = ref
+        self.label = label
+        self.labels = labels
+        self.child_offsets = child_offsets
+        self.children = children
+        self.counter = counter
+
+    def __len__(self):
+        return len(self.actor)
+
+    def get_children(self, i):
+        """
+        Return the list of ids of the children of node i (excluding countermeasure).
+        """
+        return self.children[self.child_offsets[i] : self.child_offsets[i + 1]].tolist()
+
+    def get_inputs(self, i):
+        """
+        Return the list of ids of the children of node i, followed by its countermeasure if any.
+        """
+        inputs = self.get_children(i)
+        if self.counter[i] != -1:
+            inputs.append(int(self.counter[i]))
+        return inputs
+
+    def get_label(self, i):
+        return self.labels[self.label[i]]
+
+    def node(self, i):
+        """
+        Return an ADNode with the actor, label and refinement of node i.
+        """
+        return ADNode(
+            ACTORS[self.actor[i]],
+            self.get_label(i),
+            REFINEMENTS[self.ref[i]] or None,
+        )
+
+    def to_dict(self):
+        """
+        Return (dictionary, root, nodes): the dictionary for the ADTree
+        creation, its root and the list of its ADNodes indexed by node id.
+        Countermeasures are placed after the other children.
+        """
+        nodes = [self.node(i) for i in range(len(self))]
+        dictionary = {}
+        for i, node in enumerate(nodes):
+            children = [nodes[c] for c in self.get_children(i)]
+            if self.counter[i] != -1:
+                children.append(nodes[self.counter[i]])
+            dictionary[node] = children
+        return dictionary, nodes[0], nodes
+
+    def parent_counts(self):
+        """
+        Return the array of the numbers of parents of the nodes.
+        """
+        n = len(self)
+        return np.bincount(self.children, minlength=n) + np.bincount(
+            self.counter[self.counter != -1],
+            minlength=n,
+        )
+
+    def subtree(self, i):
+        """
+        Return (sub, nodes, label_ids): the CompactTree of the subtree rooted in
+        node i (node i becomes node 0), the array of the ids in self of its nodes
+        and the array of the ids in self of its labels.
+        """
+        reachable = {i}
+        stack = [i]
+        while stack:
+            j = stack.pop()
+            for c in self.get_inputs(j):
+                if c not in reachable:
+                    reachable.add(c)
+                    stack.append(c)
+
+        # keeping the order of the ids keeps the parents before their children
+        nodes = np.array(sorted(reachable), dtype=np.int64)
+        new_ids = np.full(len(self), -1, dtype=np.int32)
+        new_ids[nodes] = np.arange(len(nodes), dtype=np.int32)
+
+        label_ids, label = np.unique(self.label[nodes], return_inverse=True)
+        counts = np.diff(self.child_offsets)[nodes]
+        child_offsets = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(counts, out=child_offsets[1:])
+        children = new_ids[
+            np.concatenate(
+                [
+                    self.children[self.child_offsets[j] : self.child_offsets[j + 1]]
+                    for j in nodes
+                ],
+            )
+        ]
+        counter = self.counter[nodes]
+        counter = np.where(counter != -1, new_ids[counter], -1).astype(np.int32)
+
+        sub = CompactTree(
+            self.actor[nodes],
+            self.ref[nodes],
+            label.astype(np.int32).ravel(),
+            [self.labels[k] for k in label_ids],
+            child_offsets,
+            children,
+            counter,
+        )
+        return sub, nodes, label_ids
+
+    def nbytes(self):
+        """
+        Memory used by the node arrays, in bytes.
+        """
+        return sum(
+            arr.nbytes
+            for arr in (
+                self.actor,
+                self.ref,
+                self.label,
+                self.child_offsets,
+                self.children,
+                self.counter,
+            )
+        )
+
+
+def compact_tree(dictionary, root):
+    """
+    Dictionary of an ADTree and its root --> (CompactTree, list of ADNodes indexed by node id).
+
+    Nodes that cannot be reached from the root are left out.
+    """
+    reachable = {root}
+    queue = deque([root])
+    while queue:
+        for child in dictionary[queue.popleft()]:
+            if child not in reachable:
+                reachable.add(child)
+                queue.append(child)
+
+    # number the nodes so that parents come before their children (Kahn's algorithm)
+    in_degree = dict.fromkeys(reachable, 0)
+    for node in reachable:
+        for child in dictionary[node]:
+            in_degree[child] += 1
+
+    nodes = []
+    queue = deque([root])
+    while queue:
+        node = queue.popleft()
+        nodes.append(node)
+        for child in dictionary[node]:
+            in_degree[child] -= 1
+            if in_degree[child] == 0:
+                queue.append(child)
+
+    ids = {node: i for i, node in enumerate(nodes)}
+    n = len(nodes)
+
+    actor = np.empty(n, dtype=np.uint8)
+    ref = np.empty(n, dtype=np.uint8)
+    label = np.empty(n, dtype=np.int32)
+    child_offsets = np.zeros(n + 1, dtype=np.int64)
+    counter = np.full(n, -1, dtype=np.int32)
+    labels = []
+    label_ids = {}
+    children = []
+
+    for i, node in enumerate(nodes):
+        actor[i] = ACTORS.index(node.type)
+        ref[i] = REFINEMENTS.index(node.ref)
+        if node.label not in label_ids:
+            label_ids[node.label] = len(labels)
+            labels.append(node.label)
+        label[i] = label_ids[node.label]
+
+        countermeasure = None
+        for child in dictionary[node]:
+            if child.type != node.type:
+                countermeasure = child
+                counter[i] = ids[child]
+                break
+        children.extend(ids[c] for c in dictionary[node] if c is not countermeasure)
+        child_offsets[i + 1] = len(children)
+
+    ct = CompactTree(
+        actor,
+        ref,
+        label,
+        labels,
+        child_offsets,
+        np.array(children, dtype=np.int32),
+        counter,
+    )
+    return ct, nodes
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from adtrees.adnode import ADNode
+from adtrees.adtree import ADTree
+from adtrees.basic_assignment import BasicAssignment
+from utils.util import as_points
+
+if TYPE_CHECKING:
+    from adtrees.attribute_domain import AttrDomain
+
+
+class IncrementalEvaluator:
+    """
+    Bottom-up evaluation that keeps the Pareto front of every node, and
+    re-evaluates only what an update affects.
+
+    class IncrementalEvaluator(self, domain, tree, ba)
+
+    Parameters
+    ----------
+    domain : AttrDomain
+    tree : ADTree
+    ba : BasicAssignment
+        The evaluator listens to the updates of 'ba' (see close()).
+
+    After a change of the value of a label, only the fronts of the nodes
+    bearing the label and of their ancestors are re-evaluated; after adding
+    or removing a child (through self.add_child() / self.remove_child()),
+    only the fronts of the parent and of its ancestors. The fronts are
+    re-evaluated lazily, by the next call to self.front().
+
+    Examples
+    ----------
+    >>> T, ba = load('./data/trees_w_assignments/thesis_dag.xml')
+    >>> ev = IncrementalEvaluator(min_cost_attr, T, ba)
+    >>> ev.front()
+    >>> ba['a1'] = 5  # or ev['a1'] = 5
+    >>> ev.front()  # re-evaluates the ancestors of the nodes labelled 'a1'
+    """
+
+    def __init__(self, domain: AttrDomain, tree: ADTree, ba: BasicAssignment):
+        self.domain = domain
+        self.tree = tree
+        self.ba = ba
+        # (node, whether its INH gate is evaluated) -> front
+        self.fronts = {}
+        # number of fronts computed so far
+        self.evaluated = 0
+        ba.listeners.append(self._on_update)
+
+    def close(self):
+        """
+        Stop listening to the updates of the basic assignment.
+        """
+        if self._on_update in self.ba.listeners:
+            self.ba.listeners.remove(self._on_update)
+
+    def __setitem__(self, label, value):
+        self.ba[label] = value
+
+    def _on_update(self, label, value):
+        self.invalidate(node for node in self.tree.get_nodes(label) if node.is_basic())
+
+    def invalidate(self, nodes):
+        """
+        Drop the fronts of 'nodes' and of all their ancestors.
+        """
+        unvisited = list(nodes)
+        while unvisited:
+            node = unvisited.pop()
+            dropped = [self.fronts.pop((node, inh), None) for inh in (False, True)]
+            # the ancestors of a node without a front have no front either
+            if any(pf is not None for pf in dropped):
+                unvisited.extend(self.tree.get_parents(node))
+
+    def add_child(self, parent: ADNode, child: ADNode):
+        """
+        Same as ADTree.add_child(); the fronts of 'parent' and its ancestors are dropped.
+        """
+        self.tree.add_child(parent, child)
+        self.invalidate([parent])
+
+    def remove_child(self, parent: ADNode, child: ADNode):
+        """
+        Same as ADTree.remove_child(); the fronts of 'parent' and its ancestors,
+        and of the nodes removed from the tree, are dropped.
+        """
+        self.invalidate([parent])
+        self.tree.remove_child(parent, child)
+        self.fronts = {
+            key: pf for key, pf in self.fronts.items() if key[0] in self.tree.dict
+        }
+
+    def front(self, node: ADNode | None = None):
+        """
+        Return the Pareto front of 'node' (by default, of the root), as
+        AttrDomain.evaluate_bu would compute it.
+        """
+        if node is None:
+            node = self.tree.root
+        return as_points(self.__evaluate(node, self.tree.is_countered(node)))
+
+    def __evaluate(self, node, is_inh_gate):
+        """
+        Front of 'node', evaluating the missing fronts below it in post-order
+        with an explicit stack (see AttrDomain.__bottomup).
+        """
+        tree = self.tree
+        domain = self.domain
+        fronts = self.fronts
+
+        def inputs_of(node, is_inh_gate):
+            counter = tree.get_counter(node)
+            if is_inh_gate:
+                inputs = [(node, False), (counter, True)]
+            else:
+                inputs = [
+                    (c, True) for c in tree.get_children(node) if c is not counter
+                ]
+            return [(c, check and tree.is_countered(c)) for c, check in inputs]
+
+        stack = [(node, is_inh_gate, False)]
+        while stack:
+            node, is_inh_gate, expanded = stack.pop()
+            key = (node, is_inh_gate)
+            if key in fronts:
+                continue
+            if not expanded:
+                stack.append((node, is_inh_gate, True))
+                stack.extend((c, inh, False) for c, inh in inputs_of(node, is_inh_gate))
+                continue
+
+            if is_inh_gate:
+                def_op, att_op = domain._get_combine_operators(node.type, "INH")
+                pf = domain._combine(
+                    [fronts[key] for key in inputs_of(node, is_inh_gate)],
+                    def_op,
+                    att_op,
+                )
+            elif node.is_basic():
+                pf = domain._leaf_front(node.type, self.ba[node.label])
+            else:
+                # children with the same label are evaluated once, as in _process_children
+                pf_map = {c.label: fronts[c, inh] for c, inh in inputs_of(node, False)}
+                def_op, att_op = domain._get_combine_operators(node.type, node.ref)
+                pf = domain._combine(list(pf_map.values()), def_op, att_op)
+
+            fronts[key] = pf
+            self.evaluated += 1
+
+        return fronts[node, is_inh_gate]
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from adtrees import binary_cache
+from adtrees.adtree import ADTree
+from adtrees.basic_assignment import BasicAssignment
+from utils.adtparser import parse_xml
+from utils.adtparser import share_subtrees
+
+
+def load(path, share=False):
+    """
+    Load the tree and the basic assignment stored in an ADTool .xml file.
+
+    Equivalent to (ADTree(path), BasicAssignment(path)), except that the file
+    is read (or its compiled binary file loaded) only once.
+
+    If share is True, structurally identical subtrees (ADTool repeats the
+    subtree of a shared subgoal) are collapsed into a single shared node,
+    and the resulting tree is a DAG (see utils.adtparser.share_subtrees).
+
+    Examples
+    ----------
+    >>> T, ba = load('./data/trees_w_assignments/thesis_dag.xml')
+    """
+    if binary_cache.ENABLED:
+        compact, assignment = binary_cache.load(path)
+        tree = ADTree(compact=compact)
+    else:
+        dictionary, _, assignment = parse_xml(path)
+        tree = ADTree(dictionary=dictionary)
+
+    if share:
+        dictionary, _ = share_subtrees(tree.dict, tree.root)
+        tree = ADTree(dictionary=dictionary)
+
+    ba = BasicAssignment()
+    ba.map = assignment
+
+    return tree, ba
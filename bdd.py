@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import hashlib
 import itertools
-import re
+import json
+import os
+import pickle
+from collections import OrderedDict
 from timeit import default_timer as timer
 
 import dd.bdd as _bdd
@@ -11,8 +15,11 @@ from colorama import init
 from adtrees.adnode import ADNode
 from adtrees.adtree import ADTree
 from adtrees.basic_assignment import BasicAssignment
+from adtrees.compact import AND
+from adtrees.compact import BASIC
+from adtrees.loader import load
 from utils.util import remove_dominated_pts
-from utils.util import remove_low_att_pts
+from utils.util import restrict_front
 
 init(autoreset=True)
 
@@ -28,7 +35,437 @@ def _eval_path_cost(
     return def_cost, att_cost
 
 
-pf_storage = {}
+class ParetoMemo:
+    """
+    Pareto fronts of BDD nodes computed by compute_pf_bu, keyed by
+    (node, goal, root type, budget, threshold).
+
+    class ParetoMemo(self, max_size=None)
+
+    If max_size is given, the least recently used fronts are evicted so that
+    at most max_size are kept. A memo must only be shared by evaluations on
+    the same BDD manager under the same basic assignment.
+
+    Examples
+    ----------
+    >>> memo = ParetoMemo(max_size=10000)
+    >>> pf = compute_pf_bu(bdd, root, defenses, ba, 'a', memo=memo)
+    >>> memo.stats()
+    """
+
+    def __init__(self, max_size: int | None = None):
+        self.fronts = OrderedDict()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.fronts)
+
+    def get(self, key):
+        """
+        Return the front stored under 'key', or None.
+        """
+        pf = self.fronts.get(key)
+        if pf is not None:
+            self.hits += 1
+            self.fronts.move_to_end(key)
+        return pf
+
+    def put(self, key, pf):
+        """
+        Store a newly computed front under 'key'.
+        """
+        self.misses += 1
+        self.fronts[key] = pf
+        self.fronts.move_to_end(key)
+        if self.max_size is not None:
+            while len(self.fronts) > self.max_size:
+                self.fronts.popitem(last=False)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.fronts)}
+
+
+def level_costs(
+    bdd: _bdd.BDD,
+    defenses: list[str],
+    ba: BasicAssignment,
+) -> list[tuple[bool, float]]:
+    """
+    Return, for every level of 'bdd', the pair (is the variable a defense, its value under 'ba').
+    """
+    defenses = set(defenses)
+    return [(var in defenses, ba[var]) for _, var in sorted(bdd._level_to_var.items())]
+
+
+def build_bdd(bdd: _bdd.BDD, tree: ADTree, keep_ref: bool = False) -> int:
+    """
+    Build the BDD of the boolean function of 'tree' in 'bdd', whose variables
+    (the basic actions of the tree) are declared already, and return its root.
+
+    The tree is walked bottom-up and every node is built once with the
+    operations of the manager, so subtrees shared in a DAG are shared in the
+    BDD as well. The nodes built along the way that are not part of the
+    result are garbage collected.
+
+    If keep_ref, the root is returned referenced (see dd's incref), so that
+    later garbage collections keep it; the caller must decref it.
+    """
+    ct = tree.compact()
+    built = [None] * len(ct)
+
+    # children have larger ids than their parents
+    for i in range(len(ct) - 1, -1, -1):
+        if ct.ref[i] == BASIC:
+            u = bdd.var(ct.get_label(i))
+        else:
+            op = "and" if ct.ref[i] == AND else "or"
+            u = bdd.true if op == "and" else bdd.false
+            for c in ct.get_children(i):
+                u = bdd.apply(op, u, built[c])
+
+        if ct.counter[i] != -1:
+            # INH gate between `i` and its counter
+            u = bdd.apply("diff", u, built[ct.counter[i]])
+        built[i] = u
+
+    root = built[0]
+    bdd.incref(root)
+    bdd.collect_garbage()
+    if not keep_ref:
+        bdd.decref(root)
+    return root
+
+
+def _declared_order(tree: ADTree):
+    return tree.get_basic_actions("d") + tree.get_basic_actions("a")
+
+
+def compile_bdd(
+    tree: ADTree,
+    order: list[str] | None = None,
+    keep_ref: bool = False,
+) -> tuple[_bdd.BDD, int]:
+    """
+    Return (BDD manager, root) of a new BDD of 'tree', whose variables are
+    declared in 'order' (by default, the defenses first, then the attacks, in
+    the order of tree.get_basic_actions). The defenses must come first, so
+    they are above the attacks.
+
+    If keep_ref, the root is referenced (see build_bdd).
+    """
+    if order is None:
+        order = _declared_order(tree)
+    bdd = _bdd.BDD()
+    bdd.configure(reordering=False)
+    bdd.declare(*order)
+    return bdd, build_bdd(bdd, tree, keep_ref)
+
+
+def _defenses_first(tree: ADTree, labels):
+    """
+    Order of the variables: the defenses, then the attacks, each in the order of 'labels'.
+    """
+    defenses = set(tree.get_basic_actions("d"))
+    return [lbl for lbl in labels if lbl in defenses] + [
+        lbl for lbl in labels if lbl not in defenses
+    ]
+
+
+def _dfs_order(tree: ADTree, weight):
+    """
+    Basic actions in depth-first order, the inputs of every node being
+    visited by decreasing weight[input].
+    """
+    ct = tree.compact()
+    labels = {}
+    stack = [0]
+    visited = set()
+    while stack:
+        i = stack.pop()
+        if i in visited:
+            continue
+        visited.add(i)
+        if ct.ref[i] == BASIC:
+            labels.setdefault(ct.get_label(i))
+        # the heaviest input ends up on top of the stack
+        stack.extend(sorted(ct.get_inputs(i), key=lambda j: weight[j]))
+    return _defenses_first(tree, labels)
+
+
+def order_declared(tree: ADTree, ba: BasicAssignment) -> list[str]:
+    """
+    The defenses, then the attacks, in the order of tree.get_basic_actions.
+    """
+    return _declared_order(tree)
+
+
+def order_dfs(tree: ADTree, ba: BasicAssignment) -> list[str]:
+    """
+    Fan-in heuristic: depth-first order of the basic actions, the largest
+    inputs of every node being visited first, so that the variables of a
+    subtree are close together.
+    """
+    ct = tree.compact()
+    size = [1] * len(ct)
+    # children have larger ids than their parents
+    for i in range(len(ct) - 1, -1, -1):
+        size[i] += sum(size[j] for j in ct.get_inputs(i))
+    return _dfs_order(tree, size)
+
+
+def order_cost(tree: ADTree, ba: BasicAssignment) -> list[str]:
+    """
+    Cost-weighted heuristic: depth-first order of the basic actions, the
+    inputs of every node being visited by decreasing total value of the basic
+    actions below them.
+    """
+    ct = tree.compact()
+    costs = ba.intern(ct.labels)
+    total = [0.0] * len(ct)
+    for i in range(len(ct) - 1, -1, -1):
+        if ct.ref[i] == BASIC:
+            total[i] = float(costs[ct.label[i]])
+        total[i] += sum(total[j] for j in ct.get_inputs(i))
+    return _dfs_order(tree, total)
+
+
+def order_interleaved(tree: ADTree, ba: BasicAssignment) -> list[str]:
+    """
+    Interleaving heuristic: the order of every node interleaves those of its
+    inputs, taking their variables in turn.
+    """
+    ct = tree.compact()
+    orders = [None] * len(ct)
+    for i in range(len(ct) - 1, -1, -1):
+        inputs = [orders[j] for j in ct.get_inputs(i)]
+        if ct.ref[i] == BASIC:
+            inputs.insert(0, [ct.get_label(i)])
+        merged = {}
+        for column in itertools.zip_longest(*inputs):
+            merged.update((lbl, None) for lbl in column if lbl is not None)
+        orders[i] = list(merged)
+    return _defenses_first(tree, orders[0])
+
+
+# static variable ordering heuristics, see find_order
+ORDERINGS = {
+    "declared": order_declared,
+    "dfs": order_dfs,
+    "cost": order_cost,
+    "interleaved": order_interleaved,
+}
+
+# JSON file holding the best order found for every structural hash, see find_order
+ORDERS_PATH = os.environ.get("ADTREES_BDD_ORDERS")
+
+
+def sift(bdd: _bdd.BDD, root: int, defenses: list[str]) -> None:
+    """
+    Rudell's sifting of the variables of 'bdd', constrained so that every
+    defense stays above every attack: every variable is moved to the level,
+    among those of its group, where the BDD of 'root' is the smallest.
+    """
+    defenses = set(defenses)
+    n = len(bdd.vars)
+    n_defenses = sum(var in defenses for var in bdd.vars)
+
+    bdd.incref(root)
+    bdd.collect_garbage()
+    levels = bdd._levels()
+    for var in [bdd.var_at_level(k) for k in range(n)]:
+        first, last = (0, n_defenses - 1) if var in defenses else (n_defenses, n - 1)
+        if first == last:
+            continue
+        level = bdd.level_of_var(var)
+        # move to the closest end of the group, then through the whole group
+        start, end = (first, last) if 2 * level < first + last else (last, first)
+        _bdd._shift(bdd, level, start, levels)
+        sizes = _bdd._shift(bdd, start, end, levels)
+        _bdd._shift(bdd, end, min(sizes, key=sizes.get), levels)
+    bdd.decref(root)
+
+
+def find_order(
+    tree: ADTree,
+    ba: BasicAssignment,
+    path: str | None = None,
+    sifting: bool = True,
+) -> list[str]:
+    """
+    Return the variable order, defenses first, giving the smallest BDD of
+    'tree' among the ORDERINGS heuristics and the order stored for its
+    structure in the JSON file 'path' (by default, ORDERS_PATH), then
+    improved by constrained sifting (see sift).
+
+    If the result is better than the stored order, it is stored in 'path'.
+
+    Examples
+    ----------
+    >>> order = find_order(T, ba, './bdds/orders.json')
+    >>> bdd, root = compile_bdd(T, order)
+    """
+    path = ORDERS_PATH if path is None else path
+    key = tree.structural_hash()
+    stored = _load_orders(path).get(key)
+
+    candidates = [heuristic(tree, ba) for heuristic in ORDERINGS.values()]
+    if stored is not None:
+        candidates.append(stored["order"])
+
+    best = None
+    for order in candidates:
+        bdd, root = compile_bdd(tree, order)
+        if best is None or len(bdd) < len(best[0]):
+            best = bdd, root
+
+    bdd, root = best
+    if sifting:
+        sift(bdd, root, tree.get_basic_actions("d"))
+    order = [bdd.var_at_level(k) for k in range(len(bdd.vars))]
+
+    if path is not None and (stored is None or len(bdd) < stored["size"]):
+        _store_order(path, key, order, len(bdd))
+    return order
+
+
+def _load_orders(path):
+    if path is None:
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _store_order(path, key, order, size):
+    orders = _load_orders(path)
+    orders[key] = {"order": order, "size": size}
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(orders, f)
+        os.replace(tmp, path)
+    except OSError:
+        # read-only location; the stored orders are only an optimization
+        pass
+
+
+class BDDCache:
+    """
+    Compiled BDDs, i.e., pairs (BDD manager, root) as returned by
+    compile_bdd, keyed by ADTree.structural_hash() and the variable order.
+
+    class BDDCache(self, max_size=16, directory=None)
+
+    At most max_size BDDs are kept in memory, the least recently used ones
+    being evicted. If a directory is given, every compiled BDD is also
+    stored there as '<key>.p' (dd's pickle format) and loaded from it by
+    later processes. The managers are shared by all the users of the cache
+    and must not be modified: the functions of this module only read them
+    (compute_pf_all_def cofactors a copy).
+
+    The cache holds a reference (see dd's incref) to the root of every BDD
+    it keeps, so garbage collections in the managers do not free them, and
+    releases it when the BDD is evicted or the cache cleared.
+
+    Examples
+    ----------
+    >>> cache = BDDCache(directory='./bdds/cache')
+    >>> for ba in assignments:
+    ...     bdd, root = cache.get(T)
+    ...     pf = compute_pf_bu(bdd, root, T.get_basic_actions('d'), ba, 'a')
+    """
+
+    def __init__(self, max_size: int = 16, directory: str | None = None):
+        self.entries = OrderedDict()
+        self.max_size = max_size
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(
+        self,
+        tree: ADTree,
+        order: list[str] | None = None,
+    ) -> tuple[_bdd.BDD, int]:
+        """
+        Return (BDD manager, root) of the BDD of 'tree' with the variable order
+        'order' (see compile_bdd), compiled or loaded if needed.
+        """
+        if order is None:
+            order = _declared_order(tree)
+        # the same order, given or by default, gives the same key
+        digest = hashlib.sha256("\0".join(order).encode("utf-8")).hexdigest()
+        key = f"{tree.structural_hash()}-{digest}"
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        self.misses += 1
+        entry = self._load(key)
+        if entry is None:
+            entry = compile_bdd(tree, order, keep_ref=True)
+            self._store(key, entry)
+
+        self.entries[key] = entry
+        while len(self.entries) > self.max_size:
+            bdd, root = self.entries.popitem(last=False)[1]
+            bdd.decref(root)
+        return entry
+
+    def clear(self):
+        """
+        Remove all the BDDs from memory (not from the directory).
+        """
+        while self.entries:
+            bdd, root = self.entries.popitem()[1]
+            bdd.decref(root)
+
+    def __del__(self):
+        # dd asserts that no nodes are referenced when a manager is deleted
+        self.clear()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.p")
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+        bdd = _bdd.BDD()
+        bdd.configure(reordering=False)
+        try:
+            (root,) = bdd.load(self._path(key))
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return None
+        bdd.incref(root)
+        return bdd, root
+
+    def _store(self, key, entry):
+        if self.directory is None:
+            return
+        bdd, root = entry
+        target = self._path(key)
+        tmp = f"{target}.{os.getpid()}.tmp.p"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            bdd.dump(tmp, roots=[root])
+            os.replace(tmp, target)
+        except OSError:
+            # read-only location; the directory is only an optimization
+            pass
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
 
 
 def compute_pf_bu(
@@ -38,98 +475,155 @@ def compute_pf_bu(
     ba: BasicAssignment,
     root_type: str,
     goal: bool = True,
+    levels: list[tuple[bool, float]] | None = None,
+    budget: float | None = None,
+    threshold: float | None = None,
+    memo: ParetoMemo | None = None,
 ) -> list[tuple[float, float]]:
-    # Avoid revisiting nodes
-    if u in pf_storage:
-        return pf_storage[u]
-
-    p = abs(u)
-
-    # Complemented edge, swap goal
-    if u < 0:
-        goal = not goal
-
-    # terminal ?
-    if p == 1:
+    """
+    Pareto front of the BDD node 'u', computed bottom-up.
+
+    The nodes are visited in post-order with an explicit stack, so the
+    number of levels of 'bdd' is not limited by the recursion limit.
+
+    If a budget or a threshold is given, the front of every node is
+    restricted to the query (see utils.util.restrict_front).
+
+    The fronts are looked up in and added to 'memo' (a temporary one, if
+    None), so a memo passed to repeated calls on the same BDD manager and
+    basic assignment reuses their fronts.
+    """
+    if levels is None:
+        levels = level_costs(bdd, defenses, ba)
+    if memo is None:
+        memo = ParetoMemo()
+    context = (root_type, budget, threshold)
+    # fronts of this evaluation, keyed by (node, goal); a complemented node
+    # with some goal is the node with the opposite goal
+    fronts = {}
+
+    def terminal_pf(goal):
         if root_type == "a":
             return [(0, 0)] if goal else [(0, float("inf"))]
         else:
             return [(0, float("inf"))] if goal else [(0, 0)]
 
-    # non-terminal
-    i, v, w = bdd._succ[p]
-    assert v and w, "Invalid BDD structure"
-
-    pf_left = compute_pf_bu(bdd, v, defenses, ba, root_type, goal)
-    pf_right = compute_pf_bu(bdd, w, defenses, ba, root_type, goal)
-
-    # Taking a `right` edge means we activated `u`, so add it's cost
-    u_label = bdd._level_to_var[i]
-    is_defense = u_label in defenses
+    def key_of(u, goal):
+        return abs(u), goal != (u < 0)
+
+    def is_pending(u, goal):
+        if abs(u) == 1:
+            return False
+        key = key_of(u, goal)
+        if key in fronts:
+            return False
+        pf = memo.get((*key, *context))
+        if pf is None:
+            return True
+        fronts[key] = pf
+        return False
+
+    def pf_of(u, goal):
+        if abs(u) == 1:
+            # Complemented edge, swap goal
+            return terminal_pf(not goal if u < 0 else goal)
+        return fronts[key_of(u, goal)]
+
+    stack = [(u, goal)]
+    while stack:
+        node, node_goal = stack[-1]
+        if not is_pending(node, node_goal):
+            stack.pop()
+            continue
+
+        # Complemented edge, swap goal
+        node, node_goal = key_of(node, node_goal)
+
+        # non-terminal
+        i, v, w = bdd._succ[node]
+        assert v and w, "Invalid BDD structure"
+
+        if is_pending(v, node_goal) or is_pending(w, node_goal):
+            # evaluate `v` first, then `w`
+            stack.append((w, node_goal))
+            stack.append((v, node_goal))
+            continue
+        stack.pop()
+
+        pf_left = pf_of(v, node_goal)
+        pf_right = pf_of(w, node_goal)
+
+        # Taking a `right` edge means we activated `u`, so add it's cost
+        is_defense, cost = levels[i]
+
+        if is_defense:
+            pf_right = [(d + cost, a) for d, a in pf_right]
+        else:
+            pf_right = [(d, a + cost) for d, a in pf_right]
 
-    if is_defense:
-        pf_right = [(d + ba[u_label], a) for d, a in pf_right]
-    else:
-        pf_right = [(d, a + ba[u_label]) for d, a in pf_right]
+        pf = pf_left + pf_right
 
-    pf = pf_left + pf_right
+        if is_defense:  # necessary for counter_example_dag
+            pf = remove_dominated_pts(pf)
+        else:
+            cost_dict = {}
+            for point in pf:
+                def_cost = point[0]
+                att_cost = point[1]
+                if def_cost not in cost_dict or att_cost < cost_dict[def_cost]:
+                    cost_dict[def_cost] = att_cost
 
-    if is_defense:  # necessary for counter_example_dag
-        pf = remove_dominated_pts(pf)
-    else:
-        cost_dict = {}
-        for point in pf:
-            def_cost = point[0]
-            att_cost = point[1]
-            if def_cost not in cost_dict or att_cost < cost_dict[def_cost]:
-                cost_dict[def_cost] = att_cost
+            pf = list(cost_dict.items())
 
-        pf = list(cost_dict.items())
+        if budget is not None or threshold is not None:
+            pf = restrict_front(pf, budget, threshold)
 
-    pf_storage[u] = pf
+        fronts[node, node_goal] = pf
+        memo.put((node, node_goal, *context), pf)
 
-    return pf
+    return pf_of(u, goal)
 
 
 failed_paths = []
 
 
 def find_all_paths_bdd(bdd: _bdd.BDD, u, root_type: str, path=None, goal=True):
-    """Recurse to enumerate models."""
+    """Enumerate models, with an explicit stack instead of recursion."""
 
-    if not path:
-        path = {}
+    stack = [(u, path or {}, goal)]
+    while stack:
+        u, path, goal = stack.pop()
+        p = abs(u)
 
-    p = abs(u)
+        # Complemented edge, swap goal
+        if u < 0:
+            goal = not goal
 
-    # Complemented edge, swap goal
-    if u < 0:
-        goal = not goal
+        # terminal ?
+        if p == 1:
+            path_dict = {bdd._level_to_var[i]: v for i, v in path.items()}
 
-    # terminal ?
-    if p == 1:
-        path_dict = {bdd._level_to_var[i]: v for i, v in path.items()}
+            goal_is_reached = goal if root_type == "a" else not goal
 
-        goal_is_reached = goal if root_type == "a" else not goal
+            if goal_is_reached:
+                yield path_dict
+            else:
+                failed_paths.append(path_dict)
+            continue
 
-        if goal_is_reached:
-            yield path_dict
-        else:
-            failed_paths.append(path_dict)
-        return
-
-    # non-terminal
-    i, v, w = bdd._succ[p]
-    assert v and w, "Invalid BDD structure"
+        # non-terminal
+        i, v, w = bdd._succ[p]
+        assert v and w, "Invalid BDD structure"
 
-    path_u_false = dict(path)
-    path_u_false[i] = False
+        path_u_false = dict(path)
+        path_u_false[i] = False
 
-    path_u_true = dict(path)
-    path_u_true[i] = True
+        path_u_true = dict(path)
+        path_u_true[i] = True
 
-    yield from find_all_paths_bdd(bdd, v, root_type, path_u_false, goal)
-    yield from find_all_paths_bdd(bdd, w, root_type, path_u_true, goal)
+        # the `false` branch is enumerated first
+        stack.append((w, path_u_true, goal))
+        stack.append((v, path_u_false, goal))
 
 
 def compute_pf_all_paths(
@@ -183,79 +677,127 @@ def compute_pf_all_paths(
     return pf
 
 
-def run_all_def(
-    boolean_expr: str,
+def compute_pf_all_def(
+    bdd: _bdd.BDD,
+    u: int,
     defenses: list[str],
-    attacks: list[str],
     ba: BasicAssignment,
     root_type: str,
-):
-
-    start = timer()
-    results = []
-    for def_vector in itertools.product([0, 1], repeat=len(defenses)):
-        def_expr = boolean_expr
-        def_dict = dict(zip(defenses, def_vector))
-        for k, v in def_dict.items():
-            pattern = rf"\b{str(k)}(?=[\s()&|!])"  # string `k` followed by either whitespace,(,),&,|,!
-            def_expr = re.sub(pattern, str(bool(v)), def_expr)
-
-        bdd = _bdd.BDD()
-        bdd.declare(*attacks)
-        root = bdd.add_expr(def_expr)
-        def_cost = sum(ba[d] for d in defenses if d in def_dict and def_dict[d])
+) -> list[tuple[float, float]]:
+    """
+    Pareto front of the BDD node 'u', obtained from the attack fronts of
+    all its cofactors by the defense vectors.
+
+    The cofactors are computed in the same manager, one defense at a time
+    along a trie of the defense vectors, so the cofactors by the prefixes of
+    the vectors are shared. The attack fronts of the cofactors share a
+    ParetoMemo, and are merged into the front as they are computed.
+
+    The defenses a cofactor does not depend on are left unset, and a branch
+    of the trie is skipped when its cofactor was already reached with a
+    defense cost at most as large: their points would all be dominated.
+
+    The cofactors are built in 'bdd', with 'u' referenced, and garbage
+    collected at the end, so a manager shared through a BDDCache is left as
+    it was. Unreferenced nodes of 'bdd' other than those of 'u' are freed.
+    """
+    bdd.incref(u)
+    defenses = sorted(defenses, key=bdd.level_of_var)
+    # the cofactors by all the defenses only depend on attacks
+    levels = level_costs(bdd, [], ba)
+    memo = ParetoMemo()
+    # least defense cost with which every cofactor was reached
+    reached = {}
 
-        def_vector_pf = [
-            (def_cost, a) for _, a in compute_pf_bu(bdd, root, [], ba, root_type)
-        ]
-        results.extend(def_vector_pf)
+    pf = []
+    # (cofactor, n. of defenses fixed, defense cost)
+    stack = [(u, 0, 0)]
+    while stack:
+        v, k, def_cost = stack.pop()
+        if reached.get(v, float("inf")) <= def_cost:
+            continue
+        reached[v] = def_cost
+
+        # skip the defenses 'v' does not depend on: setting them only adds cost
+        low = high = v
+        while low == high and k < len(defenses):
+            d = defenses[k]
+            low = bdd.let({d: False}, v)
+            high = bdd.let({d: True}, v)
+            k += 1
+        if low == high:
+            att_pf = compute_pf_bu(bdd, v, [], ba, root_type, levels=levels, memo=memo)
+            pf = remove_dominated_pts(pf + [(def_cost, a) for _, a in att_pf])
+            continue
+
+        stack.append((high, k, def_cost + ba[d]))
+        # the cheaper branch first, so that more branches are skipped
+        stack.append((low, k, def_cost))
+
+    bdd.collect_garbage()
+    bdd.decref(u)
+    return pf
 
-    results = remove_low_att_pts(results)
-    results = remove_dominated_pts(results)
 
-    time_elapsed = timer() - start
-    return time_elapsed, results
+def run(
+    filepath,
+    method="bu",
+    dump=False,
+    budget=None,
+    threshold=None,
+    cache: BDDCache | None = None,
+    ordering: str = "declared",
+):
+    """
+    Build the BDD of the tree stored in 'filepath' and compute its Pareto front
+    with 'method' ('bu', 'all_paths' or 'all_def').
 
+    With method 'bu', a budget or a threshold restricts the front to a query
+    (see compute_pf_bu), e.g., utils.util.best_within_budget(pf, budget).
 
-def run(filepath, method="bu", dump=False):
-    # reset pf_Storage for bdd_bu
-    global pf_storage
-    pf_storage = {}
+    If a cache is given, the BDD is taken from it (see BDDCache) instead of
+    being compiled.
 
-    ba = BasicAssignment(filepath)
-    tree = ADTree(filepath)
+    The variables are ordered by the heuristic ORDERINGS[ordering], or by
+    find_order if ordering is 'best'.
+    """
+    tree, ba = load(filepath)
     defenses = tree.get_basic_actions("d")
     attacks = tree.get_basic_actions("a")
 
     start = timer()
 
-    expr = tree.get_boolean_expression()
-
-    if method == "all_def":
-        return run_all_def(expr, defenses, attacks, ba, tree.root.type)
-
-    bdd = _bdd.BDD()
-    bdd.configure(reordering=False)
-    bdd.declare(*(defenses + attacks))
-    root = bdd.add_expr(expr)
-    custom_order = {d: i for i, d in enumerate(defenses + attacks)}
-
-    if PRINT_PROGRESS:
-        print(f"Initial size: {len(bdd)}")
+    if ordering == "best":
+        order = find_order(tree, ba)
+    else:
+        order = ORDERINGS[ordering](tree, ba)
 
-    _bdd.reorder(bdd, custom_order)
+    if cache is None:
+        bdd, root = compile_bdd(tree, order)
+    else:
+        bdd, root = cache.get(tree, order)
 
     if dump:
         bdd.dump("./bdds/bdd_graph_custom_reorder.png", roots=[root])
 
     if PRINT_PROGRESS:
-        print(f"Size after custom-order: {len(bdd)}")
+        print(f"Size: {len(bdd)}")
 
     pf = []
     if method == "bu":
-        pf = compute_pf_bu(bdd, root, defenses, ba, tree.root.type)
+        pf = compute_pf_bu(
+            bdd,
+            root,
+            defenses,
+            ba,
+            tree.root.type,
+            budget=budget,
+            threshold=threshold,
+        )
     elif method == "all_paths":
         pf = compute_pf_all_paths(bdd, root, ba, defenses, attacks, tree.root.type)
+    elif method == "all_def":
+        pf = compute_pf_all_def(bdd, root, defenses, ba, tree.root.type)
 
     elapsed_time = timer() - start
 
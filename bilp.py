@@ -2,6 +2,8 @@ from __future__ import annotations
 
 import itertools
 import sys
+from heapq import heappop
+from heapq import heappush
 from timeit import default_timer as timer
 
 from colorama import Fore
@@ -10,9 +12,12 @@ from gurobipy import GRB
 from gurobipy import LinExpr
 from gurobipy import Model
 
-from adtrees.adnode import ADNode
 from adtrees.adtree import ADTree
 from adtrees.basic_assignment import BasicAssignment
+from adtrees.compact import AND
+from adtrees.compact import BASIC
+from adtrees.compact import OR
+from adtrees.loader import load
 from utils.util import remove_dominated_pts
 from utils.util import remove_low_att_pts
 
@@ -49,59 +54,57 @@ def get_model(
     """
     m = Model("bilp")
 
-    x_attacks = []
-    x_deffs = []
-    x_refinements = []
+    # The model is built directly from the compact representation of the tree
+    ct = T.compact()
+    # values of the basic actions, indexed by label id
+    costs = ba.intern(ct.labels).tolist()
+
+    x_attacks = set()
+    x_deffs = set()
+    x_refinements = set()
 
     attack_cost = LinExpr()
     defense_cost = LinExpr()
     # Maps the ADTree nodes labels to Gurobi model variables
     model_vars: dict[str, LinExpr] = {}
 
-    def get_inh_label(action: ADNode, counter: ADNode) -> str:
-        return f"INH_{action.label}_{counter.label}"
-
-    def check_unique_label(label: ADNode, elements: list) -> bool:
-        """Check if label is unique in the list."""
-        return len(elements) == 0 or not any(l.label == label for l in elements)
+    def get_inh_label(action: int, counter: int) -> str:
+        return f"INH_{ct.get_label(action)}_{ct.get_label(counter)}"
 
-    def get_model_node(node: ADNode, check_inh: bool = True) -> LinExpr:
+    def get_model_node(i: int, check_inh: bool = True) -> LinExpr:
         """
-        This method should be used instead of `model_vars[node]` when
+        This method should be used instead of `model_vars[label]` when
         using nodes which may have multiple labels
         """
-        countered = check_inh and T.is_countered(node)
-        label = (
-            node.label if not countered else get_inh_label(node, T.get_counter(node))
-        )
+        countered = check_inh and ct.counter[i] != -1
+        label = ct.get_label(i) if not countered else get_inh_label(i, ct.counter[i])
 
         return model_vars[label]
 
     # Add all nodes of the tree to BILP variables
-    for ad_node in T.dict.keys():
-        label = ad_node.label
+    for i in range(len(ct)):
+        label = ct.get_label(i)
 
-        if ad_node.ref == "":  # basic step
-            if ad_node.type == "a" and check_unique_label(label, x_attacks):
+        if ct.ref[i] == BASIC:  # basic step
+            if ct.actor[i] == 0 and label not in x_attacks:
                 x = m.addVar(vtype=GRB.BINARY, name=label)
                 model_vars[label] = x
-                x_attacks.append(ad_node)
-                attack_cost.add(ba[ad_node.label] * get_model_node(ad_node, False))
+                x_attacks.add(label)
+                attack_cost.add(costs[ct.label[i]] * x)
 
-            elif ad_node.type == "d" and check_unique_label(label, x_deffs):
+            elif ct.actor[i] == 1 and label not in x_deffs:
                 x = m.addVar(vtype=GRB.BINARY, name=label)
                 model_vars[label] = x
-                x_deffs.append(ad_node)
-                defense_cost.add(ba[ad_node.label] * get_model_node(ad_node, False))
+                x_deffs.add(label)
+                defense_cost.add(costs[ct.label[i]] * x)
 
-        elif check_unique_label(label, x_refinements):
-            x_refinements.append(ad_node)
+        elif label not in x_refinements:
+            x_refinements.add(label)
             x = m.addVar(vtype=GRB.BINARY, name=label)
             model_vars[label] = x
 
-        countered = T.get_counter(ad_node)
-        if countered:
-            inh_label = get_inh_label(ad_node, countered)
+        if ct.counter[i] != -1:
+            inh_label = get_inh_label(i, ct.counter[i])
             x = m.addVar(vtype=GRB.BINARY, name=inh_label)
             model_vars[inh_label] = x
 
@@ -110,16 +113,17 @@ def get_model(
     m.setObjectiveN(defense_cost, index=1, priority=0, name="defense_cost")
 
     # root is always reached
-    m.addConstr(get_model_node(T.root) == 1, "root_is_reached")
+    m.addConstr(get_model_node(0) == 1, "root_is_reached")
 
     # We start from the bottom nodes to have the necessary variable as we go up the tree
-    for ad_node in reversed(T.dict.keys()):
-        model_node = get_model_node(ad_node, False)
-
-        countered = T.get_counter(ad_node)
-        if countered:  # INH gate
-            x_inh_node = get_model_node(ad_node, True)
-            inh_label = get_inh_label(ad_node, countered)
+    for i in reversed(range(len(ct))):
+        model_node = get_model_node(i, False)
+        label = ct.get_label(i)
+
+        countered = ct.counter[i]
+        if countered != -1:  # INH gate
+            x_inh_node = get_model_node(i, True)
+            inh_label = get_inh_label(i, countered)
             # x_INH is attack * (1-counterattack)
             m.addConstr(
                 x_inh_node <= 1 - get_model_node(countered),
@@ -132,13 +136,11 @@ def get_model(
             # x_INH is 0 when attack is 0
             m.addConstr(x_inh_node <= model_node, name=f"{inh_label}_OFF")
 
-        if ad_node.ref == "":  # basic event
+        if ct.ref[i] == BASIC:  # basic event
             continue
 
         label_children = [
-            (c.label, get_model_node(c))
-            for c in T.get_children(ad_node)
-            if not countered or c != countered
+            (ct.get_label(c), get_model_node(c)) for c in ct.get_children(i)
         ]
         children_sum_expr = LinExpr()
         children_sum_expr.addTerms(
@@ -146,23 +148,23 @@ def get_model(
             [c[1] for c in label_children],
         )
 
-        if ad_node.ref == "AND":
+        if ct.ref[i] == AND:
             # x_AND must be 1 if all children are 1
             for c_label, c in label_children:
-                m.addConstr(model_node <= c, name=f"{ad_node.label}_{c_label}")
+                m.addConstr(model_node <= c, name=f"{label}_{c_label}")
 
             # Constraint that x_AND must be 0 if either child is 0
             m.addConstr(
                 model_node >= children_sum_expr - (len(label_children) - 1),
-                name=f"{ad_node.label}_bound",
+                name=f"{label}_bound",
             )
-        elif ad_node.ref == "OR":
+        elif ct.ref[i] == OR:
             # X_OR must be 1 if at least one child is 1
             for c_label, c in label_children:
-                m.addConstr(model_node >= c, name=f"{ad_node.label}_{c_label}")
+                m.addConstr(model_node >= c, name=f"{label}_{c_label}")
 
             # X_OR must be 0 if all children are 0
-            m.addConstr(model_node <= children_sum_expr, name=f"{ad_node.label}_bound")
+            m.addConstr(model_node <= children_sum_expr, name=f"{label}_bound")
 
     m.setParam(GRB.Param.OutputFlag, 0)
 
@@ -261,9 +263,137 @@ def compute_pf(m: Model, defense_cost: LinExpr) -> list[tuple[float, float]]:
     return results
 
 
+def _maximal_vectors(coeffs: list[float], budget: float):
+    """
+    The defense vectors whose cost is at most 'budget' and to which no other
+    defense can be added within it, with their costs. The vectors over the
+    budget are never generated.
+    """
+    n = len(coeffs)
+    # (n. of defenses decided, vector so far, its cost)
+    stack = [(0, (), 0)] if budget >= 0 else []
+    while stack:
+        i, def_vector, cost = stack.pop()
+        if i == n:
+            if all(x or cost + c > budget for c, x in zip(coeffs, def_vector)):
+                yield def_vector, cost
+            continue
+        stack.append((i + 1, def_vector + (0,), cost))
+        if cost + coeffs[i] <= budget:
+            stack.append((i + 1, def_vector + (1,), cost + coeffs[i]))
+
+
+def _vectors_by_cost(coeffs: list[float]):
+    """
+    All the defense vectors with their costs, generated lazily in order of
+    increasing cost.
+    """
+    n = len(coeffs)
+    order = sorted(range(n), key=lambda i: coeffs[i])
+
+    def vector(chosen):
+        def_vector = [0] * n
+        for k in chosen:
+            def_vector[order[k]] = 1
+        return tuple(def_vector)
+
+    yield vector(()), 0
+    if n == 0:
+        return
+    # (cost, chosen positions in 'order'); a set with largest position k is
+    # followed by the same set with k + 1 added, and with k replaced by k + 1
+    heap = [(coeffs[order[0]], (0,))]
+    while heap:
+        cost, chosen = heappop(heap)
+        yield vector(chosen), cost
+        k = chosen[-1]
+        if k + 1 < n:
+            heappush(heap, (cost + coeffs[order[k + 1]], chosen + (k + 1,)))
+            heappush(
+                heap,
+                (
+                    cost - coeffs[order[k]] + coeffs[order[k + 1]],
+                    chosen[:-1] + (k + 1,),
+                ),
+            )
+
+
+def query_budget(m: Model, defense_cost: LinExpr, budget: float) -> float:
+    """
+    Minimum attack cost under the best defense whose cost is at most 'budget'.
+
+    Adding a defense never lowers the attack cost, so the answer is bounded
+    by the attack cost under all the defenses, and only the defense vectors
+    within the budget to which no other defense can be added are solved,
+    each with a single optimization, until the bound is reached.
+    """
+    x_d = [defense_cost.getVar(i) for i in range(defense_cost.size())]
+    coeffs = [defense_cost.getCoeff(i) for i in range(defense_cost.size())]
+
+    _add_exclusion_constraint(m, x_d, [1] * len(x_d))
+    m.optimize()
+    bound = m.objVal if m.status == GRB.OPTIMAL else float("inf")
+    if sum(coeffs) <= budget:
+        return bound
+
+    best = None
+    for def_vector, _ in _maximal_vectors(coeffs, budget):
+        _add_exclusion_constraint(m, x_d, def_vector)
+        m.optimize()
+        # infeasible: the root cannot be reached
+        att_cost = m.objVal if m.status == GRB.OPTIMAL else float("inf")
+        best = att_cost if best is None else max(best, att_cost)
+        if best >= bound:
+            break
+
+    return best
+
+
+def query_threshold(
+    m: Model,
+    defense_cost: LinExpr,
+    attack_cost: LinExpr,
+    threshold: float,
+) -> float:
+    """
+    Cheapest defense that pushes the minimum attack cost above 'threshold';
+    infinity if there is none.
+
+    The attack cost is constrained to at most 'threshold', so every defense
+    vector is checked with a single feasibility solve. The vectors are
+    generated in order of increasing cost, and the first infeasible one is
+    the answer. The subsets of a feasible vector are feasible as well, and
+    are skipped; if all the defenses together are feasible, there is no
+    answer and no other vector is solved.
+    """
+    x_d = [defense_cost.getVar(i) for i in range(defense_cost.size())]
+    coeffs = [defense_cost.getCoeff(i) for i in range(defense_cost.size())]
+    bound = m.addConstr(attack_cost <= threshold, name="threshold")
+
+    answer = float("inf")
+    _add_exclusion_constraint(m, x_d, [1] * len(x_d))
+    m.optimize()
+    if m.status != GRB.OPTIMAL:
+        feasible_vectors = []
+        for def_vector, cost in _vectors_by_cost(coeffs):
+            if any(
+                all(x <= y for x, y in zip(def_vector, fv)) for fv in feasible_vectors
+            ):
+                continue
+
+            _add_exclusion_constraint(m, x_d, def_vector)
+            m.optimize()
+            if m.status != GRB.OPTIMAL:
+                answer = cost
+                break
+            feasible_vectors.append(def_vector)
+
+    m.remove(bound)
+    return answer
+
+
 def run(filepath: str) -> tuple[float, list[tuple[float, float]], int, int]:
-    T = ADTree(filepath)
-    ba = BasicAssignment(filepath)
+    T, ba = load(filepath)
 
     start = timer()
 
@@ -278,7 +408,8 @@ def run(filepath: str) -> tuple[float, list[tuple[float, float]], int, int]:
         print(Fore.RED + f"Removed {list(set(results) - set(results))}")
 
     time_elapsed = timer() - start
-    return time_elapsed, results, T.subtree_size(), len(T.get_basic_actions("d"))
+    stats = T.stats()
+    return time_elapsed, results, stats.size, stats.defenses
 
 
 def run_average(filepath, no_runs=1):
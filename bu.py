@@ -4,9 +4,12 @@ import os
 from copy import deepcopy
 from timeit import default_timer as timer
 
+import numpy as np
+
 from adtrees.adtree import ADTree
 from adtrees.attribute_domain import AttrDomain
 from adtrees.basic_assignment import BasicAssignment
+from adtrees.loader import load
 
 min_cost_attr = AttrDomain(min, sum, min, sum, 0, float("inf"))
 
@@ -35,19 +38,42 @@ def measure_dummiest(tree: ADTree, ba: BasicAssignment) -> float:
     return timer() - start, pf
 
 
+def measure_cutsets(tree: ADTree, ba: BasicAssignment) -> float:
+    _tree = deepcopy(tree)
+    _ba = deepcopy(ba)
+    start = timer()
+    pf = min_cost_attr.evaluate_cutsets(_tree, _ba, PRINT_PROGRESS)
+    return timer() - start, pf
+
+
+def measure_bu_batch(tree: ADTree, cost_matrix) -> float:
+    _tree = deepcopy(tree)
+    start = timer()
+    pfs = min_cost_attr.evaluate_bu_batch(_tree, cost_matrix)
+    return timer() - start, pfs
+
+
 def run(method, filepath):
-    tree = ADTree(filepath)
+    tree, ba = load(filepath)
 
-    ba = BasicAssignment(filepath)
     if method == "dummiest":
         return measure_dummiest(tree, ba)
 
+    if method == "cutsets":
+        return measure_cutsets(tree, ba)
+
     if method == "dummy-bu":
         return measure_dummy_bu(tree, ba)
 
     if method == "bu":
         return measure_bu(tree, ba)
 
+    if method == "batch":
+        # a single scenario: the assignment stored in the file
+        cost_matrix = np.array([[ba[label] for label in tree.get_basic_actions()]])
+        time, pfs = measure_bu_batch(tree, cost_matrix)
+        return time, pfs[0]
+
 
 def run_average(method, filepath, NO_RUNS=50):
     return sum(run(method, filepath)[0] for _ in range(0, NO_RUNS)) / NO_RUNS
@@ -3,8 +3,7 @@ from __future__ import annotations
 import random
 import xml.etree.ElementTree as ET
 
-from adtrees.adtree import ADTree
-from adtrees.basic_assignment import BasicAssignment
+from adtrees.loader import load
 from utils.util import generate_random_string
 
 
@@ -119,8 +118,7 @@ def create_tree(max_nodes):
     xml_tree.write(filename)
 
     # Check if the tree is correct
-    tree = ADTree(filename)
-    ba = BasicAssignment(filename)
+    tree, ba = load(filename)
     for s in tree.get_basic_actions():
         ba[s]
 
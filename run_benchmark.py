@@ -141,9 +141,7 @@ if __name__ == "__main__":
         bdd_paths = list(executor.map(eval_bdd_paths, files))
 
     for f in files:
-        T = ADTree(f)
-        tree_size = T.subtree_size()
-        defense_count = len(T.get_basic_actions("d"))
-        labels.append(f"{tree_size}({defense_count})")
+        stats = ADTree(f).stats()
+        labels.append(f"{stats.size}({stats.defenses})")
 
     save_results_to_csv(labels, dummiest, bilp, bdd_bu, bdd_all_def, bu, bdd_paths)
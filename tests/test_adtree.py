@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import sys
+
+from adtrees.adnode import ADNode
+from adtrees.adtree import ADTree
+
+
+def deep_dag(depth):
+    """
+    Chain s0 <- s1 <- ... of AND nodes in which every s_k is also the child
+    of a node x_{k+1} hanging from the root, so every s_k is shared.
+    """
+    prev = ADNode("a", "s0")
+    d = {prev: []}
+    root = ADNode("a", "root", "OR")
+    d[root] = []
+    for k in range(1, depth):
+        x = ADNode("a", f"x{k}", "AND")
+        node = ADNode("a", f"s{k}", "AND")
+        d[x] = [prev]
+        d[node] = [prev]
+        d[root].append(x)
+        prev = node
+    d[root].insert(0, prev)
+    return ADTree(dictionary=d)
+
+
+def test_render_deep_dag():
+    depth = 2 * sys.getrecursionlimit()
+    T = deep_dag(depth)
+    # s0 appears once in the chain and once under each x_k
+    formula = T.get_boolean_expression()
+    assert formula.count("s0") == depth
+    term = T.ad_term()
+    assert term.startswith("ORa(" + "ANDa(" * (depth - 1) + "s0")
+    assert term.count("s0") == depth
+
+
+def test_render_shared_subtree_once_per_parent():
+    T = deep_dag(3)
+    assert T.ad_term() == "ORa(ANDa(ANDa(s0)),ANDa(s0),ANDa(ANDa(s0)))"
@@ -1,48 +1,67 @@
 from __future__ import annotations
 
+from collections import deque
 from xml.etree.ElementTree import parse
 
 from adtrees.adnode import ADNode
 from utils.util import clean_tla_identifier
 
 
-def file_to_dict(path):
+def parse_xml(path):
     """
-    Path to an ADTool .xml output file --> dictionary for the ADTree creation.
+    Path to an ADTool .xml output file --> (dictionary, root, basic assignment).
+
+    The file is read once and walked breadth-first in a single pass, building
+    both the dictionary for the ADTree creation and the dictionary containing
+    the basic assignment. For every label, the first value found is kept.
     """
     try:
         with open(path, encoding="utf-8") as f:
             tree = parse(f)
     except FileNotFoundError as exc:
-        raise f"Couldn't load ADTree from {path}\nThere is no such file or directory." from exc
+        raise FileNotFoundError(
+            f"Couldn't load ADTree from {path}\nThere is no such file or directory.",
+        ) from exc
 
     tree_root = tree.getroot()[0]
     pt = "a"  # the root is assumed to be of the attacker's type
 
-    # unvisited_et[i] corresponds to the unvisited_adt_nodes[i]
-    unvisited_et = [tree_root]
-    unvisited_adt_nodes = [get_ad_node(tree_root, pt)]
+    root = get_ad_node(tree_root, pt)
+    d = {root: []}
+    assignment = {}
 
-    d = {unvisited_adt_nodes[0]: []}
+    # pairs (ElementTree node, corresponding ADNode) left to deal with
+    unvisited = deque([(tree_root, root)])
 
-    while unvisited_adt_nodes:
+    while unvisited:
         # take the first of the nodes that are left
-        current_et = unvisited_et.pop(0)
-        current_ad_node = unvisited_adt_nodes.pop(0)
+        current_et, current_ad_node = unvisited.popleft()
+
+        # basic assignment: the value is stored right after the label
+        if len(current_et) > 1 and current_et[1].tag == "parameter":
+            if current_ad_node.label not in assignment:
+                val = current_et[1].text  # val most probably looks like "10.0"
+                assignment[current_ad_node.label] = float(val)
 
         # take its children in the ET, turn them into ADNodes,
-        # add them to the ADTree's dictionary and to the two lists of nodes left to deal with
+        # add them to the ADTree's dictionary and to the nodes left to deal with
         pt = current_ad_node.type
+        children = d[current_ad_node]
         for child in current_et:
             if child.tag == "node":
                 ad_node_child = get_ad_node(child, pt)
-                # modify the dictionary and the lists
-                d[current_ad_node].append(ad_node_child)
+                children.append(ad_node_child)
                 d[ad_node_child] = []
-                unvisited_et.append(child)
-                unvisited_adt_nodes.append(ad_node_child)
+                unvisited.append((child, ad_node_child))
 
-    return d
+    return d, root, assignment
+
+
+def file_to_dict(path):
+    """
+    Path to an ADTool .xml output file --> dictionary for the ADTree creation.
+    """
+    return parse_xml(path)[0]
 
 
 def get_ad_node(et, pt):
@@ -88,31 +107,46 @@ def get_basic_assignment_xml(path):
     """
     Path to an ADTool .xml output file --> dictionary containing the basic assignment.
     """
-    try:
-        with open(path, encoding="utf-8") as f:
-            tree = parse(f)
-    except FileNotFoundError:
-        print(
-            f"Couldn't load the basic assignment from {path}\n\
-            There is no such file or directory.",
-        )
-
-    real_root = tree.getroot()[0]
-    result = {}
-    unvisited_et = [real_root]
-
-    while unvisited_et:
-        current_et = unvisited_et[0]
-        if len(list(current_et)) > 1 and current_et[1].tag == "parameter":
-            label = clean_tla_identifier(current_et[0].text)
-            if label not in result:
-                val = current_et[1].text  # val most probably looks like "10.0"
-                result[label] = float(val)  # int(val.split('.')[0])
+    return parse_xml(path)[2]
 
-        for child in current_et:
-            if child.tag == "node":
-                unvisited_et.append(child)
 
-        unvisited_et.pop(0)
+def share_subtrees(dictionary, root):
+    """
+    Hash-consing: collapse structurally identical subtrees, i.e., nodes with the
+    same actor, refinement, label and (shared) children, into one shared node.
 
-    return result
+    Dictionary of an ADTree and its root --> (dictionary of the resulting DAG, its root).
+    The nodes of the result are listed parents first.
+    """
+    canonical = {}  # node -> its representative
+    table = {}  # (actor, refinement, label, children) -> representative
+    children_of = {}  # representative -> its (shared) children
+
+    # post-order, so that the children are canonicalized before their parent
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if node in canonical:
+            continue
+        if not expanded:
+            stack.append((node, True))
+            stack.extend((c, False) for c in dictionary[node] if c not in canonical)
+            continue
+        children = [canonical[c] for c in dictionary[node]]
+        key = (node.type, node.ref, node.label, tuple(id(c) for c in children))
+        if key not in table:
+            table[key] = node
+            children_of[node] = children
+        canonical[node] = table[key]
+
+    # list the nodes parents first
+    root = canonical[root]
+    shared = {root: children_of[root]}
+    unvisited = deque([root])
+    while unvisited:
+        for child in children_of[unvisited.popleft()]:
+            if child not in shared:
+                shared[child] = children_of[child]
+                unvisited.append(child)
+
+    return shared, root
@@ -5,11 +5,24 @@ import re
 import secrets
 import string
 
+import numpy as np
+
+# Characters that are not allowed in a TLA+ identifier
+_NON_IDENTIFIER_CHARS = re.compile(r"[^a-zA-Z0-9_]")
+
+# Fronts combined into more points than this are handled as (N, 2) arrays
+ARRAY_THRESHOLD = 256
+
 
 def remove_dominated_pts(points):
     """
     Remove all dominated points (not better in both dimensions)
+
+    If points is an (N, 2) array, so is the result (see remove_dominated_array).
     """
+    if isinstance(points, np.ndarray):
+        return remove_dominated_array(points)
+
     if not points:
         return []
 
@@ -19,6 +32,17 @@ def remove_dominated_pts(points):
     # Ascending defenses, descending attacks
     sorted_points = sorted(points, key=lambda point: (point[0], -point[1]))
 
+    return remove_dominated_sorted_pts(sorted_points)
+
+
+def remove_dominated_sorted_pts(sorted_points):
+    """
+    Same as remove_dominated_pts, for points already sorted by ascending
+    defense and descending attack costs.
+    """
+    if not sorted_points:
+        return []
+
     pareto_front = [sorted_points[0]]
 
     for point in sorted_points[1:]:
@@ -32,10 +56,229 @@ def remove_dominated_pts(points):
     return pareto_front
 
 
+def remove_dominated_array(points):
+    """
+    Same as remove_dominated_pts, for an (N, 2) array of points.
+    Returns the (K, 2) array of the Pareto front, sorted by ascending defense costs.
+    """
+    if len(points) <= 1:
+        return points
+
+    # Ascending defenses, descending attacks
+    points = points[np.lexsort((-points[:, 1], points[:, 0]))]
+
+    # A point is kept iff its attack cost beats all the points before it,
+    # i.e., the last point kept
+    atts = points[:, 1]
+    keep = np.empty(len(points), dtype=bool)
+    keep[0] = True
+    keep[1:] = atts[1:] > np.maximum.accumulate(atts[:-1])
+
+    return points[keep]
+
+
+def as_array(front):
+    """
+    Return the points of 'front' as an (N, 2) float array.
+    """
+    if isinstance(front, np.ndarray):
+        return front
+    return np.array(front, dtype=np.float64).reshape(-1, 2)
+
+
+def as_points(front):
+    """
+    Return the points of 'front' as a list of (defense, attack) tuples.
+    """
+    if isinstance(front, np.ndarray):
+        return list(map(tuple, front.tolist()))
+    return front
+
+
+def _use_arrays(front1, front2, n_points):
+    return (
+        isinstance(front1, np.ndarray)
+        or isinstance(front2, np.ndarray)
+        or n_points > ARRAY_THRESHOLD
+    )
+
+
+def combine_fronts_sum(front1, front2):
+    """
+    Pareto front of the points (d1 + d2, a1 + a2), for (d1, a1) in front1
+    and (d2, a2) in front2.
+
+    Both fronts are sorted by ascending defense costs, as returned by
+    remove_dominated_pts, and so is the result. Large combinations are
+    computed, and returned, as arrays.
+    """
+    if _use_arrays(front1, front2, len(front1) * len(front2)):
+        front1 = as_array(front1)
+        front2 = as_array(front2)
+        return remove_dominated_array(
+            np.column_stack(
+                (
+                    np.add.outer(front1[:, 0], front2[:, 0]).ravel(),
+                    np.add.outer(front1[:, 1], front2[:, 1]).ravel(),
+                ),
+            ),
+        )
+
+    if len(front1) < len(front2):
+        front1, front2 = front2, front1
+
+    # every point of front2 shifts front1 into a sorted run,
+    # so sorting the points only has to merge the runs
+    points = [(d1 + d2, a1 + a2) for d2, a2 in front2 for d1, a1 in front1]
+    points.sort(key=lambda point: (point[0], -point[1]))
+
+    return remove_dominated_sorted_pts(points)
+
+
+def combine_fronts_min(front1, front2):
+    """
+    Pareto front of the points (d1 + d2, min(a1, a2)), for (d1, a1) in front1
+    and (d2, a2) in front2.
+
+    Both fronts are sorted by ascending defense costs, as returned by
+    remove_dominated_pts, and so is the result. Only len(front1) + len(front2)
+    points are combined: a point of the result takes its attack cost from one
+    of the fronts, and is best completed by the cheapest point of the other
+    front that has at least that attack cost.
+    """
+    if _use_arrays(front1, front2, len(front1) + len(front2)):
+        front1 = as_array(front1)
+        front2 = as_array(front2)
+        return remove_dominated_array(
+            np.concatenate(
+                (
+                    _min_completions_array(front1, front2),
+                    _min_completions_array(front2, front1),
+                ),
+            ),
+        )
+
+    points = _min_completions(front1, front2) + _min_completions(front2, front1)
+    points.sort(key=lambda point: (point[0], -point[1]))
+
+    return remove_dominated_sorted_pts(points)
+
+
+def _min_completions(front1, front2):
+    points = []
+    j = 0
+    for d1, a1 in front1:
+        # attack costs increase along the fronts
+        while j < len(front2) and front2[j][1] < a1:
+            j += 1
+        if j == len(front2):
+            break
+        points.append((d1 + front2[j][0], a1))
+    return points
+
+
+def _min_completions_array(front1, front2):
+    # attack costs increase along the fronts
+    j = np.searchsorted(front2[:, 1], front1[:, 1], side="left")
+    found = j < len(front2)
+    return np.column_stack(
+        (front1[found, 0] + front2[j[found], 0], front1[found, 1]),
+    )
+
+
+def thin_front(front, delta):
+    """
+    Thin a Pareto front (as returned by remove_dominated_pts) to a subset that
+    (1 + delta)-covers it: every point (d, a) left out is covered by a kept point
+    (d', a') with d' <= d and a' >= a / (1 + delta).
+
+    Returns (thinned front, factor), where factor <= 1 + delta is the smallest
+    value that the kept points cover the front with.
+    """
+    points = as_points(front)
+    if not points:
+        return front, 1.0
+
+    thinned = [points[0]]
+    factor = 1.0
+    for point in points[1:]:
+        # attack costs increase along the front
+        if point[1] > (1 + delta) * thinned[-1][1]:
+            thinned.append(point)
+        elif thinned[-1][1] > 0:
+            factor = max(factor, point[1] / thinned[-1][1])
+
+    if isinstance(front, np.ndarray):
+        thinned = as_array(thinned)
+    return thinned, factor
+
+
+def thin_front_to_size(front, max_size, delta=0.0):
+    """
+    Same as thin_front, with the smallest delta (doubled from 'delta' on)
+    that leaves at most max(max_size, 3) points.
+    """
+    thinned, factor = thin_front(front, delta)
+    delta = max(delta, 1e-3)
+    # the first point, one point of finite positive cost and the one of infinite cost
+    # are always kept
+    while len(thinned) > max(max_size, 3):
+        thinned, factor = thin_front(front, delta)
+        delta *= 2
+    return thinned, factor
+
+
+def restrict_front(points, budget=None, threshold=None):
+    """
+    Restrict a list (or an (N, 2) array) of points to a query: the points with
+    a defense cost above 'budget' are dropped, and the attack costs above
+    'threshold' are replaced by infinity. Both are sound at every node of an
+    evaluation, since the defense costs only grow towards the root and the
+    attack costs above the threshold stay above it.
+    """
+    if isinstance(points, np.ndarray):
+        if budget is not None:
+            points = points[points[:, 0] <= budget]
+        if threshold is not None:
+            points = points.copy()
+            points[points[:, 1] > threshold, 1] = np.inf
+        return points
+
+    if budget is not None:
+        points = [(d, a) for d, a in points if d <= budget]
+    if threshold is not None:
+        points = [(d, a if a <= threshold else float("inf")) for d, a in points]
+    return points
+
+
+def best_within_budget(front, budget):
+    """
+    Largest attack cost of the points of a front whose defense cost is at
+    most 'budget', i.e., the minimum attack cost under the best defense the
+    budget allows. None if no point fits the budget.
+    """
+    att_costs = [a for d, a in as_points(front) if d <= budget]
+    return max(att_costs) if att_costs else None
+
+
+def cheapest_above_threshold(front, threshold):
+    """
+    Smallest defense cost of the points of a front whose attack cost exceeds
+    'threshold', i.e., the cheapest defense that pushes the minimum attack
+    cost above it. Infinity if there is no such defense.
+    """
+    return min((d for d, a in as_points(front) if a > threshold), default=float("inf"))
+
+
 def remove_low_att_pts(points):
     """
     ATTACKER'S VIEW - Remove all points which have a lower attack cost for the same defense cost.
+
+    If points is an (N, 2) array, so is the result (see remove_low_att_array).
     """
+    if isinstance(points, np.ndarray):
+        return remove_low_att_array(points)
+
     if not points:
         return []
 
@@ -49,12 +292,29 @@ def remove_low_att_pts(points):
     return list(cost_dict.items())
 
 
+def remove_low_att_array(points):
+    """
+    Same as remove_low_att_pts, for an (N, 2) array of points.
+    Returns a (K, 2) array, sorted by ascending defense costs.
+    """
+    if len(points) <= 1:
+        return points
+
+    # Ascending defenses, descending attacks: keep the first point of every defense cost
+    points = points[np.lexsort((-points[:, 1], points[:, 0]))]
+    keep = np.empty(len(points), dtype=bool)
+    keep[0] = True
+    keep[1:] = points[1:, 0] != points[:-1, 0]
+
+    return points[keep]
+
+
 def clean_tla_identifier(identifier):
     """
     Clean and convert a string to a valid TLA+ identifier.
     """
     # Remove all non-alphanumeric characters and underscores
-    cleaned = re.sub(r"[^a-zA-Z0-9_]", "", identifier)
+    cleaned = _NON_IDENTIFIER_CHARS.sub("", identifier)
 
     # If the cleaned string starts with a digit, prefix with an underscore
     if cleaned and cleaned[0].isdigit():